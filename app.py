@@ -1,5 +1,5 @@
 import streamlit as st
-from gold_analysis import show_gold_analysis
+from gold_analysis import show_gold_analysis, INGEST_MODE
 from sales_analysis import show_sales_analysis
 
 # 设置页面配置
@@ -10,6 +10,11 @@ st.set_page_config(
     initial_sidebar_state="collapsed"  # 设置侧边栏默认收起
 )
 
+# 后台采集模式下，在进程内启动采集线程（只启动一次）
+if INGEST_MODE == "background":
+    from ingest import start_background_ingestion
+    start_background_ingestion()
+
 # 添加标题
 st.title("📊 全球市场数据分析仪表板")
 
@@ -0,0 +1,334 @@
+"""性能基准测试
+
+运行方式：
+
+    python benchmark.py            # 运行全部基准测试
+    python benchmark.py align      # 只运行指定的基准测试
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def timed(func, *args, repeat=3, **kwargs):
+    """多次运行函数，返回最短耗时（秒）和最后一次的结果"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def make_bars(index, base, seed):
+    """生成模拟的 yfinance 行情数据（多级列索引）"""
+    rng = np.random.default_rng(seed)
+    close = base * np.exp(np.cumsum(rng.normal(0, 0.001, len(index))))
+    columns = pd.MultiIndex.from_product([['Close'], ['SYM']])
+    return pd.DataFrame(close, index=index, columns=columns)
+
+
+def legacy_align(gold_data, usd_cny_data):
+    """旧版逐行对齐实现，仅作为基准对照"""
+    historical_data = []
+    for date in gold_data.index:
+        if date in usd_cny_data.index:
+            gold_price_usd = float(gold_data.loc[date, 'Close'].iloc[0])
+            usd_cny_rate = float(usd_cny_data.loc[date, 'Close'].iloc[0])
+            gold_price_cny = gold_price_usd * usd_cny_rate
+            historical_data.append({
+                "date": date.strftime('%Y-%m-%d'),
+                "international_price_usd": gold_price_usd,
+                "international_price_cny": gold_price_cny,
+                "china_price_cny": gold_price_cny * 1.03,
+                "usd_cny_rate": usd_cny_rate,
+                "premium_rate": 1.03
+            })
+    return pd.DataFrame(historical_data)
+
+
+def bench_align():
+    """黄金/汇率数据对齐：逐行循环 vs 向量化"""
+    from gold_analysis import align_gold_fx
+
+    cases = [
+        ("1年日线", pd.bdate_range(end='2025-01-01', periods=252), True),
+        ("30年日线", pd.bdate_range(end='2025-01-01', periods=252 * 30), True),
+        ("5年分钟线", pd.date_range(end='2025-01-01', periods=252 * 1440 * 5, freq='min'), False),
+    ]
+
+    for name, index, run_legacy in cases:
+        gold = make_bars(index, 2000, seed=1)
+        # 汇率数据缺少约1%的时间点，模拟真实数据的错位
+        fx = make_bars(index[np.random.default_rng(2).random(len(index)) > 0.01], 7.2, seed=3)
+
+        vec_time, result = timed(align_gold_fx, gold, fx)
+        line = f"{name:<10} {len(index):>10,} 行  向量化: {vec_time * 1000:9.1f} ms"
+        if run_legacy:
+            legacy_time, _ = timed(legacy_align, gold, fx, repeat=1)
+            line += f"  逐行循环: {legacy_time * 1000:9.1f} ms  加速: {legacy_time / vec_time:6.1f}x"
+        print(line + f"  输出 {len(result):,} 行")
+
+
+def make_price_frame(rows):
+    """生成 rows 天的模拟历史数据（标准列）"""
+    rng = np.random.default_rng(4)
+    days = np.arange(rows).astype('datetime64[D]')
+    usd = 2000 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+    rate = np.full(rows, 7.2)
+    return pd.DataFrame({
+        'date': np.datetime_as_string(days, unit='D'),
+        'international_price_usd': usd,
+        'international_price_cny': usd * rate,
+        'china_price_cny': usd * rate * 1.03,
+        'usd_cny_rate': rate,
+        'premium_rate': np.full(rows, 1.03)
+    })
+
+
+def bench_bulk_write():
+    """批量写入：逐行连接+提交 vs save_gold_prices_bulk"""
+    import os
+    import sqlite3
+    import tempfile
+    import database
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        database.configure_database(path)
+
+        # 旧方式：每行一个连接、一次提交（即逐行调用 save_gold_price）
+        legacy_rows = 2000
+        df = make_price_frame(legacy_rows)
+        days = database.dates_to_days(df['date'])
+        start = time.perf_counter()
+        for day, row in zip(days.tolist(), df.itertuples(index=False)):
+            conn = sqlite3.connect(path)
+            conn.execute(database.UPSERT_GOLD_PRICE, (day, row.date) + tuple(row[1:6]))
+            conn.commit()
+            conn.close()
+        legacy_time = time.perf_counter() - start
+        print(f"逐行写入   {legacy_rows:>10,} 行  {legacy_time * 1000:9.1f} ms"
+              f"  {legacy_rows / legacy_time:12,.0f} 行/秒")
+
+        for rows in (365, 100_000, 1_000_000):
+            df = make_price_frame(rows)
+            elapsed, written = timed(database.save_gold_prices_bulk, df, repeat=1)
+            print(f"批量写入   {written:>10,} 行  {elapsed * 1000:9.1f} ms"
+                  f"  {written / elapsed:12,.0f} 行/秒")
+
+        database.configure_database(database.DB_PATH)
+
+
+def bench_write_queue():
+    """并发写入：各会话同步写库 vs 后台写入队列"""
+    import os
+    import tempfile
+    import threading
+    import database
+
+    sessions, writes = 8, 250
+    df = make_price_frame(sessions * writes)
+    params = [(day, row.date) + tuple(row[1:6]) for day, row in
+              zip(database.dates_to_days(df['date']).tolist(), df.itertuples(index=False))]
+
+    def sync_write(item):
+        with database.get_connection() as conn:
+            conn.execute(database.UPSERT_GOLD_PRICE, item)
+            conn.commit()
+
+    def queued_write(item):
+        database.write_queue.submit(database.UPSERT_GOLD_PRICE, item)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.configure_database(os.path.join(tmp, 'bench.db'))
+        for name, write in (("同步写入", sync_write), ("写入队列", queued_write)):
+            latencies = []
+
+            def session(chunk):
+                for item in chunk:
+                    start = time.perf_counter()
+                    write(item)
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            threads = [threading.Thread(target=session, args=(params[i::sessions],))
+                       for i in range(sessions)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            submitted = time.perf_counter() - start
+            database.write_queue.flush()
+            total = time.perf_counter() - start
+            print(f"{name}  {sessions}个会话 x {writes}次  调用方耗时: 平均 "
+                  f"{np.mean(latencies) * 1000:6.3f} ms  p99 {np.percentile(latencies, 99) * 1000:7.3f} ms"
+                  f"  全部提交: {submitted * 1000:7.1f} ms  全部落盘: {total * 1000:7.1f} ms")
+        print(f"写入队列统计: {database.write_queue.stats()}")
+        database.configure_database(database.DB_PATH)
+
+
+def bench_store():
+    """列式存储：打开并切片多年日线/分钟线数据"""
+    import os
+    import sqlite3
+    import tempfile
+    from price_store import ColumnStore, PRICE_COLUMNS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cases = [
+            ("20年日线", 'D', make_price_frame(365 * 20)),
+            ("5年分钟线", 'm', None),
+        ]
+        for name, unit, df in cases:
+            if df is None:
+                rows = 252 * 1440 * 5
+                df = make_price_frame(rows)
+                df['date'] = pd.date_range(end='2025-01-01', periods=rows, freq='min').values
+
+            store = ColumnStore(f"bench_{unit}", root=tmp, unit=unit)
+            write_time, _ = timed(store.append, df, repeat=1)
+
+            # 新实例模拟进程重启后首次打开
+            start, end = df['date'].iloc[-30 * (1 if unit == 'D' else 1440)], None
+
+            def open_and_slice():
+                fresh = ColumnStore(f"bench_{unit}", root=tmp, unit=unit)
+                keys, data = fresh.read(start, end)
+                return float(data['international_price_usd'].sum())
+
+            slice_time, _ = timed(open_and_slice, repeat=5)
+            full_time, _ = timed(
+                lambda: ColumnStore(f"bench_{unit}", root=tmp, unit=unit).to_frame(), repeat=1)
+            print(f"{name:<10} {len(df):>10,} 行  写入: {write_time * 1000:8.1f} ms"
+                  f"  打开+切片最近30天: {slice_time * 1000:7.2f} ms"
+                  f"  全量读取为DataFrame: {full_time * 1000:8.1f} ms")
+
+        # 对照：从 SQLite 读取20年日线
+        df = make_price_frame(365 * 20)
+        conn = sqlite3.connect(os.path.join(tmp, 'bench.db'))
+        df.to_sql('gold_prices', conn, index=False)
+        sql_time, _ = timed(pd.read_sql_query, "SELECT * FROM gold_prices", conn)
+        conn.close()
+        print(f"对照: SQLite 读取20年日线为DataFrame: {sql_time * 1000:.1f} ms")
+
+
+def legacy_indicators(df, column='international_price_usd', window=20, periods=14):
+    """旧版三个指标函数（各自复制数据、各自计算滚动窗口），仅作为基准对照"""
+    ma = df.copy()
+    for w in (5, 10, 20, 60):
+        ma[f'MA{w}'] = ma[column].rolling(window=w).mean()
+
+    vol = df.copy()
+    vol['daily_return'] = vol[column].pct_change()
+    vol['volatility'] = vol['daily_return'].rolling(window=window).std() * np.sqrt(window)
+
+    tech = df.copy()
+    delta = tech[column].diff()
+    avg_gain = delta.clip(lower=0).rolling(window=periods).mean()
+    avg_loss = (-delta.clip(upper=0)).rolling(window=periods).mean()
+    tech['RSI'] = 100 - (100 / (1 + avg_gain / avg_loss))
+    return ma, vol, tech
+
+
+def bench_indicators():
+    """技术指标：三个 pandas 函数 vs 单次 NumPy 计算"""
+    from indicators import compute_indicators
+
+    for name, rows in (("1年日线", 252), ("30年日线", 252 * 30), ("5年分钟线", 252 * 1440 * 5)):
+        df = make_price_frame(rows)
+        prices = df['international_price_usd'].to_numpy()
+        legacy_time, _ = timed(legacy_indicators, df)
+        engine_time, _ = timed(compute_indicators, prices)
+        extras_time, _ = timed(compute_indicators, prices,
+                               extras=('ema', 'macd', 'bollinger'))
+        print(f"{name:<10} {rows:>10,} 行  pandas三函数: {legacy_time * 1000:9.1f} ms"
+              f"  单次计算: {engine_time * 1000:8.1f} ms  加速: {legacy_time / engine_time:5.1f}x"
+              f"  含EMA/MACD/布林带: {extras_time * 1000:8.1f} ms")
+
+
+def bench_slider_grid():
+    """滑块交互：每次拖动重新计算 vs 预计算二维结果后按行取值"""
+    from indicators import compute_indicators, indicator_grids
+
+    vol_windows, rsi_periods = range(5, 31), range(7, 22)
+    for name, rows in (("1年日线", 365), ("30年日线", 252 * 30)):
+        prices = make_price_frame(rows)['international_price_usd'].to_numpy()
+        recompute_time, _ = timed(compute_indicators, prices, ma_windows=(),
+                                  vol_window=20, rsi_period=14)
+        grid_time, grids = timed(indicator_grids, prices, vol_windows, rsi_periods)
+        lookup_time, _ = timed(lambda: (grids['volatility'][vol_windows.index(20)],
+                                        grids['RSI'][rsi_periods.index(14)]), repeat=100)
+        print(f"{name:<10} {rows:>8,} 行  每次拖动重新计算: {recompute_time * 1000:7.3f} ms"
+              f"  预计算全部 {len(vol_windows) + len(rsi_periods)} 个参数: {grid_time * 1000:7.3f} ms"
+              f"  拖动时取值: {lookup_time * 1e6:6.2f} us")
+
+
+def bench_cache_key():
+    """缓存命中开销：st.cache_data 对整表哈希 vs 以数据版本为键"""
+    import streamlit as st
+    from data_version import frame_version, stamp
+
+    @st.cache_data
+    def by_frame(df):
+        return len(df)
+
+    @st.cache_data
+    def by_version(_df, version):
+        return len(_df)
+
+    for name, rows in (("1年日线", 365), ("30年日线", 252 * 30), ("20万行", 200_000)):
+        df = make_price_frame(rows)
+        by_frame(df)
+        frame_time, _ = timed(by_frame, df, repeat=10)
+
+        fingerprint_time, _ = timed(frame_version, df.copy(), repeat=1)
+        stamped = stamp(df.copy(), ('store', rows))
+        by_version(stamped, frame_version(stamped))
+        version_time, _ = timed(lambda: by_version(stamped, frame_version(stamped)), repeat=10)
+        print(f"{name:<8} {rows:>8,} 行  整表哈希: {frame_time * 1000:8.3f} ms"
+              f"  版本键: {version_time * 1000:6.3f} ms"
+              f"  （无存储版本时首次计算内容指纹: {fingerprint_time * 1000:7.3f} ms）")
+
+
+def bench_chart():
+    """金价走势图：每次重新绘制 vs 渲染缓存命中"""
+    import gold_chart
+    from data_version import frame_version
+
+    df = make_price_frame(252 * 5)
+    df = pd.DataFrame({'Date': pd.date_range(end=pd.Timestamp.now(), periods=len(df)),
+                       'Close': df['international_price_usd'].to_numpy()})
+    version = frame_version(df)
+    render = gold_chart.render_chart_image
+    for time_range in ("3M", "1Y", "All"):
+        draw_time, _ = timed(render.__wrapped__, df, version, time_range)
+        render(df, version, time_range)
+        hit_time, _ = timed(render, df, version, time_range, repeat=10)
+        print(f"{time_range:<4} 重新绘制: {draw_time * 1000:8.2f} ms  缓存命中: {hit_time * 1000:6.3f} ms")
+
+
+BENCHMARKS = {
+    'align': bench_align,
+    'bulk_write': bench_bulk_write,
+    'write_queue': bench_write_queue,
+    'store': bench_store,
+    'indicators': bench_indicators,
+    'slider_grid': bench_slider_grid,
+    'cache_key': bench_cache_key,
+    'chart': bench_chart,
+}
+
+
+def main(names):
+    for name in names or BENCHMARKS:
+        print(f"== {name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
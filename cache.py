@@ -0,0 +1,399 @@
+"""两级缓存：进程内 LRU + 磁盘（SQLite）
+
+st.cache_data 只缓存在进程内存中，服务重启或崩溃后所有缓存失效，
+每个用户选择的数据窗口都要重新请求数据源。这里在内存 LRU 之后增加一个磁盘层：
+内存未命中时读取磁盘，磁盘命中的结果放回内存；重启后的进程直接从磁盘预热。
+
+    @tiered_cache(ttl=24*3600)
+    def get_usd_cny_rate():
+        ...
+
+    get_usd_cny_rate.clear()   # 清除该函数的内存和磁盘缓存
+
+所有缓存都有条目数上限，可再设置内存字节上限，超出时按最近最少使用淘汰；
+cache_report() 汇总各缓存的条目数和大致占用内存，供页面调试面板显示。
+"""
+import functools
+import hashlib
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+CACHE_DB_PATH = os.environ.get("GOLD_CACHE_DB", "cache.db")
+DEFAULT_MAX_ENTRIES = 64
+
+_MISSING = object()
+
+_registry = []  # 已创建的缓存，供 cache_report 汇总
+_registry_lock = threading.Lock()
+
+
+def _register(cache):
+    with _registry_lock:
+        _registry.append(cache)
+
+
+def approx_size(value):
+    """估算对象占用的内存字节数（DataFrame、数组按实际数据计算，其他对象按序列化大小估算）"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(approx_size(k) + approx_size(v) for k, v in value.items()) + sys.getsizeof({})
+    if isinstance(value, (list, tuple)):
+        return sum(approx_size(item) for item in value) + sys.getsizeof(())
+    if value is None or isinstance(value, (int, float, bool)):
+        return sys.getsizeof(value)
+    try:
+        return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(value)
+
+
+class TieredCache:
+    """一个命名空间的两级缓存，值需可被 pickle
+
+    内存层最多保留 max_entries 个条目、共 max_bytes 字节（None 表示不限），
+    磁盘层最多保留 max_entries 个条目。
+    """
+
+    def __init__(self, namespace, ttl=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None,
+                 path=CACHE_DB_PATH):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.path = path
+        self._memory = OrderedDict()  # 键 -> (过期时间, 值, 字节数)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}  # 键 -> 计算锁，同一个键同时只计算一次
+        self._conn = None
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        _register(self)
+
+    # ---- 磁盘层 ----
+
+    def _disk(self):
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            )
+            ''')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _disk_get(self, key, now):
+        try:
+            row = self._disk().execute(
+                "SELECT value, expires_at FROM cache_entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key)).fetchone()
+        except sqlite3.Error:
+            return _MISSING, None
+        if row is None or (row[1] is not None and row[1] <= now):
+            return _MISSING, None
+        try:
+            return pickle.loads(row[0]), row[1]
+        except Exception:
+            return _MISSING, None  # 代码升级后旧条目可能无法反序列化，当作未命中
+
+    def _disk_set(self, key, value, expires_at):
+        try:
+            conn = self._disk()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (self.namespace, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires_at))
+            # 顺便清理本命名空间的过期条目和超出上限的旧条目（INSERT OR REPLACE 会分配新的 rowid，
+            # rowid 越大越新）
+            conn.execute("DELETE FROM cache_entries WHERE namespace = ? AND expires_at <= ?",
+                         (self.namespace, time.time()))
+            conn.execute('''
+            DELETE FROM cache_entries WHERE namespace = ? AND key NOT IN (
+                SELECT key FROM cache_entries WHERE namespace = ?
+                ORDER BY rowid DESC LIMIT ?)
+            ''', (self.namespace, self.namespace, self.max_entries))
+            conn.commit()
+        except (sqlite3.Error, pickle.PicklingError):
+            pass  # 磁盘层只是加速，写入失败不影响结果
+
+    # ---- 对外接口 ----
+
+    def get(self, key, default=None, count=True):
+        """依次查找内存和磁盘，未命中或已过期返回 default；count 为 False 时不计入命中统计"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] is None or entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._stats['memory_hits'] += count
+                    return entry[1]
+                self._forget(key)
+
+            value, expires_at = self._disk_get(key, now)
+            if value is _MISSING:
+                self._stats['misses'] += count
+                return default
+            self._stats['disk_hits'] += count
+            self._remember(key, value, expires_at)
+            return value
+
+    def key_lock(self, key):
+        """返回该键的计算锁"""
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+            self._disk_set(key, value, expires_at)
+
+    def _forget(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _remember(self, key, value, expires_at):
+        self._forget(key)
+        size = approx_size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return  # 单个值超过内存上限，只保留在磁盘层
+        self._memory[key] = (expires_at, value, size)
+        self._bytes += size
+        while len(self._memory) > self.max_entries or \
+                (self.max_bytes is not None and self._bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._bytes -= evicted_size
+            self._stats['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._forget(key)
+            try:
+                self._disk().execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key))
+                self._disk().commit()
+            except sqlite3.Error:
+                pass
+
+    def clear(self):
+        """清除该命名空间在内存和磁盘中的全部条目"""
+        with self._lock:
+            self._memory.clear()
+            self._bytes = 0
+            self._key_locks.clear()
+            try:
+                self._disk().execute("DELETE FROM cache_entries WHERE namespace = ?",
+                                     (self.namespace,))
+                self._disk().commit()
+            except sqlite3.Error:
+                pass
+
+    def disk_usage(self):
+        """磁盘层的 (条目数, 字节数)"""
+        with self._lock:
+            try:
+                return tuple(self._disk().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache_entries "
+                    "WHERE namespace = ?", (self.namespace,)).fetchone())
+            except sqlite3.Error:
+                return 0, 0
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, memory_entries=len(self._memory), memory_bytes=self._bytes)
+
+    def report(self):
+        stats = self.stats()
+        disk_entries, disk_bytes = self.disk_usage()
+        return {
+            '缓存': self.namespace,
+            '类型': '内存+磁盘',
+            '条目数': stats['memory_entries'],
+            '条目上限': self.max_entries,
+            '内存(KB)': stats['memory_bytes'] / 1024,
+            '内存上限(KB)': self.max_bytes / 1024 if self.max_bytes else None,
+            '磁盘条目数': disk_entries,
+            '磁盘(KB)': disk_bytes / 1024,
+            '命中': stats['memory_hits'] + stats['disk_hits'],
+            '未命中': stats['misses'],
+            '淘汰': stats['evictions'],
+        }
+
+
+def make_key(args, kwargs):
+    """由调用参数生成缓存键"""
+    payload = pickle.dumps((args, sorted(kwargs.items())), pickle.HIGHEST_PROTOCOL)
+    return hashlib.sha1(payload).hexdigest()
+
+
+def tiered_cache(ttl=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=None, namespace=None,
+                 validate=None):
+    """两级缓存装饰器
+
+    validate(result) 返回 False 时不缓存该结果（如数据源全部失败时的空结果）。
+    缓存失效后多个会话同时请求同一个键时，只有一个会话执行函数，其余等待并复用结果。
+    被装饰的函数增加 clear() 方法和 cache 属性。
+    返回值在内存层中是共享对象，调用方不应原地修改。
+    """
+    def decorator(func):
+        cache = TieredCache(namespace or f"{func.__module__}.{func.__qualname__}",
+                            ttl=ttl, max_entries=max_entries, max_bytes=max_bytes)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            result = cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+
+            with cache.key_lock(key):
+                # 等待期间其他会话可能已经算好
+                result = cache.get(key, _MISSING, count=False)
+                if result is not _MISSING:
+                    return result
+                result = func(*args, **kwargs)
+                if validate is None or validate(result):
+                    cache.set(key, result)
+                return result
+
+        wrapper.cache = cache
+        wrapper.clear = cache.clear
+        return wrapper
+
+    return decorator
+
+
+class RangeCache:
+    """按时间区间缓存数据，请求的区间被已缓存区间包含时直接在内存中切片
+
+    数据需按 time_column 升序排列，区间为 [start, end)，start/end 与时间列可直接比较
+    （如 'YYYY-MM-DD' 字符串）。
+    """
+
+    def __init__(self, name, max_ranges=4, max_bytes=None, time_column='date'):
+        self.name = name
+        self.max_ranges = max_ranges
+        self.max_bytes = max_bytes
+        self.time_column = time_column
+        self._ranges = OrderedDict()  # (start, end) -> 数据
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        _register(self)
+
+    def _find(self, start, end):
+        for (range_start, range_end), frame in reversed(self._ranges.items()):
+            if range_start <= start and end <= range_end:
+                self._ranges.move_to_end((range_start, range_end))
+                return frame
+        return None
+
+    def _slice(self, frame, start, end):
+        from data_version import frame_version, stamp
+
+        times = frame[self.time_column].to_numpy()
+        lo = times.searchsorted(start, side='left')
+        hi = times.searchsorted(end, side='left')
+        if lo == 0 and hi == len(frame):
+            return frame
+        return stamp(frame.iloc[lo:hi], (frame_version(frame), start, end))
+
+    def get(self, start, end, load, load_start=None):
+        """返回 [start, end) 区间的数据
+
+        未被已缓存区间包含时调用 load(load_start, end) 加载（load_start 默认为 start），
+        可以一次加载更大的区间供之后的请求切片；加载结果为空时不缓存。
+        """
+        with self._lock:
+            frame = self._find(start, end)
+            self._stats['hits' if frame is not None else 'misses'] += 1
+        if frame is not None:
+            return self._slice(frame, start, end)
+
+        load_start = start if load_start is None else min(load_start, start)
+        frame = load(load_start, end)
+        if frame is None or frame.empty:
+            return frame
+
+        with self._lock:
+            self._ranges[(load_start, end)] = frame
+            self._sizes[(load_start, end)] = approx_size(frame)
+            # 至少保留刚加载的区间
+            while len(self._ranges) > 1 and (
+                    len(self._ranges) > self.max_ranges or
+                    (self.max_bytes is not None and sum(self._sizes.values()) > self.max_bytes)):
+                evicted, _ = self._ranges.popitem(last=False)
+                self._sizes.pop(evicted)
+                self._stats['evictions'] += 1
+        return self._slice(frame, start, end)
+
+    def clear(self):
+        with self._lock:
+            self._ranges.clear()
+            self._sizes.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, ranges=len(self._ranges), bytes=sum(self._sizes.values()))
+
+    def report(self):
+        stats = self.stats()
+        return {
+            '缓存': self.name,
+            '类型': '区间',
+            '条目数': stats['ranges'],
+            '条目上限': self.max_ranges,
+            '内存(KB)': stats['bytes'] / 1024,
+            '内存上限(KB)': self.max_bytes / 1024 if self.max_bytes else None,
+            '命中': stats['hits'],
+            '未命中': stats['misses'],
+            '淘汰': stats['evictions'],
+        }
+
+
+def streamlit_cache_report():
+    """st.cache_data 各函数缓存占用的内存（依赖 Streamlit 内部统计接口，不可用时返回空列表）"""
+    try:
+        from streamlit.runtime.caching import cache_data_api
+        stats = cache_data_api._data_caches.get_stats()
+    except Exception:
+        return []
+    if isinstance(stats, dict):  # 新版本按指标族分组返回
+        stats = [stat for family in stats.values() for stat in family]
+
+    usage = {}
+    for stat in stats:
+        usage[stat.cache_name] = usage.get(stat.cache_name, 0) + stat.byte_length
+    return [{'缓存': name, '类型': 'st.cache_data', '内存(KB)': size / 1024}
+            for name, size in sorted(usage.items())]
+
+
+def cache_report():
+    """汇总全部缓存的条目数、占用内存和命中情况，返回 DataFrame"""
+    with _registry_lock:
+        caches = list(_registry)
+    rows = [cache.report() for cache in caches] + streamlit_cache_report()
+    return pd.DataFrame(rows)
@@ -0,0 +1,46 @@
+"""数据版本标识
+
+st.cache_data 默认要对 DataFrame 参数做整表哈希才能找到缓存项，数据越多越慢。
+这里为数据生成一个廉价的版本标识作为缓存键，DataFrame 本身以下划线开头的参数传入
+（Streamlit 不对下划线参数做哈希），查找缓存的开销与数据量无关。
+
+版本标识记录在 df.attrs 中，同时记下行数和列名；数据被切片或增删列后
+（pandas 会把 attrs 带到新对象上）校验不通过，会重新计算内容指纹。
+"""
+import hashlib
+
+import pandas as pd
+
+VERSION_ATTR = 'data_version'
+
+
+def stamp(df, version):
+    """为数据记录版本标识（如读取时存储的版本和区间），返回 df 本身"""
+    df.attrs[VERSION_ATTR] = (version, len(df), tuple(df.columns))
+    return df
+
+
+def fingerprint(df):
+    """按内容计算指纹（对全部数据哈希一次）"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((df.shape, tuple(df.columns), tuple(map(str, df.dtypes)))).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def frame_version(df):
+    """返回数据的版本标识
+
+    优先使用 stamp 记录的版本；没有记录或数据形状已变化时计算内容指纹并记录下来，
+    同一对象再次调用时为 O(1)。原地修改数据内容（形状不变）后需要重新 stamp。
+    """
+    if df is None:
+        return None
+    stamped = df.attrs.get(VERSION_ATTR)
+    if stamped is not None:
+        version, rows, columns = stamped
+        if rows == len(df) and columns == tuple(df.columns):
+            return version
+    version = fingerprint(df)
+    stamp(df, version)
+    return version
@@ -1,129 +1,576 @@
+import atexit
+import json
+import logging
+import queue
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
 from datetime import datetime
 import streamlit as st
 
+logger = logging.getLogger(__name__)
 
-def init_db():
-    """初始化数据库，创建必要的表"""
-    conn = sqlite3.connect('gold_prices.db')
-    cursor = conn.cursor()
-
-    # 创建黄金价格表
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS gold_prices (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT NOT NULL,
-        international_price_usd REAL,
-        international_price_cny REAL,
-        china_price_cny REAL,
-        usd_cny_rate REAL,
-        premium_rate REAL,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+DB_PATH = 'gold_prices.db'
+
+# 连接参数：WAL 模式下读写互不阻塞，NORMAL 同步级别在 WAL 下仍保证一致性
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,        # 约16MB页缓存（负数表示KB）
+    'mmap_size': 268435456,      # 256MB内存映射读取
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,        # 毫秒，遇到写锁时等待而不是立即报错
+}
+
+
+class ConnectionPool:
+    """线程安全的 SQLite 连接池
+
+    连接在多个 Streamlit 会话之间复用，每个连接保留自己的预编译语句缓存，
+    相同的 SQL 语句无需重复编译。
+    """
+
+    def __init__(self, path=DB_PATH, size=8, cached_statements=256):
+        self.path = path
+        self.cached_statements = cached_statements
+        self._pool = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=30,
+            check_same_thread=False,  # 连接会在不同线程间复用，由连接池保证同一时刻只有一个线程使用
+            cached_statements=self.cached_statements
+        )
+        for name, value in PRAGMAS.items():
+            conn.execute(f"PRAGMA {name}={value}")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """借出一个连接，用完后归还；未提交的事务会被回滚"""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._pool.put_nowait(conn)
+            except queue.Full:
+                self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close_all(self):
+        """关闭连接池中的所有空闲连接"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+
+_pool = ConnectionPool()
+
+
+def get_connection():
+    """从连接池借出一个数据库连接，配合 with 语句使用"""
+    return _pool.connection()
+
+
+def configure_database(path):
+    """切换到指定路径的数据库（例如基准测试使用临时文件），并初始化表结构"""
+    global _pool
+    _pool.close_all()
+    _pool = ConnectionPool(path)
+    init_db()
+
+
+# 数据库结构版本，记录在 PRAGMA user_version 中
+SCHEMA_VERSION = 1
+
+# 日期以整数天（自1970-01-01起）作为主键，表按日期聚簇存储
+GOLD_PRICES_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS {table} (
+    day INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    international_price_usd REAL,
+    international_price_cny REAL,
+    china_price_cny REAL,
+    usd_cny_rate REAL,
+    premium_rate REAL,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+# 同一天的数据重复写入时更新而不是新增
+UPSERT_GOLD_PRICE = '''
+INSERT INTO gold_prices
+(day, date, international_price_usd, international_price_cny,
+ china_price_cny, usd_cny_rate, premium_rate)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(day) DO UPDATE SET
+    date = excluded.date,
+    international_price_usd = excluded.international_price_usd,
+    international_price_cny = excluded.international_price_cny,
+    china_price_cny = excluded.china_price_cny,
+    usd_cny_rate = excluded.usd_cny_rate,
+    premium_rate = excluded.premium_rate,
+    created_at = CURRENT_TIMESTAMP
+'''
+
+_EPOCH = datetime(1970, 1, 1)
 
+
+def date_to_day(date):
+    """将日期（字符串或日期对象）转换为自1970-01-01起的整数天"""
+    return (pd.Timestamp(date).to_pydatetime().replace(tzinfo=None) - _EPOCH).days
+
+
+def dates_to_days(dates):
+    """向量化地将日期序列（'YYYY-MM-DD' 字符串或日期）转换为整数天"""
+    dates = np.asarray(dates)
+    if dates.dtype.kind not in 'mM':
+        dates = dates.astype(str).astype('datetime64[D]')
+    return dates.astype('datetime64[D]').astype('int64')
+
+
+def _migrate_unique_day(conn):
+    """将旧版 gold_prices 表（自增id、日期可重复）迁移为按整数天唯一的表
+
+    同一天的多条记录只保留最后写入的一条。
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(gold_prices)")]
+    if not columns or 'day' in columns:
+        return
+
+    conn.execute("BEGIN")
+    conn.execute(GOLD_PRICES_SCHEMA.format(table='gold_prices_new'))
+    conn.execute('''
+    INSERT INTO gold_prices_new
+    (day, date, international_price_usd, international_price_cny,
+     china_price_cny, usd_cny_rate, premium_rate, created_at)
+    SELECT CAST(julianday(date(date)) - 2440587.5 AS INTEGER), date(date),
+           international_price_usd, international_price_cny,
+           china_price_cny, usd_cny_rate, premium_rate, created_at
+    FROM gold_prices
+    WHERE id IN (SELECT MAX(id) FROM gold_prices GROUP BY date(date))
+    ''')
+    conn.execute("DROP TABLE gold_prices")
+    conn.execute("ALTER TABLE gold_prices_new RENAME TO gold_prices")
     conn.commit()
-    conn.close()
 
 
-def save_gold_price(date, international_price_usd, international_price_cny,
-                    china_price_cny, usd_cny_rate, premium_rate):
-    """保存黄金价格数据到数据库"""
-    conn = sqlite3.connect('gold_prices.db')
-    cursor = conn.cursor()
+def init_db():
+    """初始化数据库，创建必要的表并执行结构迁移"""
+    with get_connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            _migrate_unique_day(conn)
+
+        cursor = conn.cursor()
+
+        # 创建黄金价格表
+        cursor.execute(GOLD_PRICES_SCHEMA.format(table='gold_prices'))
 
-    try:
+        # 创建历史数据同步记录表，记录已同步的日期区间 [start_date, end_date)
         cursor.execute('''
-        INSERT INTO gold_prices 
-        (date, international_price_usd, international_price_cny, 
-         china_price_cny, usd_cny_rate, premium_rate)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ''', (date, international_price_usd, international_price_cny,
-              china_price_cny, usd_cny_rate, premium_rate))
+        CREATE TABLE IF NOT EXISTS history_sync (
+            name TEXT PRIMARY KEY,
+            start_date TEXT NOT NULL,
+            end_date TEXT NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
 
+        # 创建增量指标状态表，保存 StreamingIndicators 的检查点
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS indicator_state (
+            name TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
-        st.success("数据已成功保存到数据库")
-    except Exception as e:
-        st.error(f"保存数据时出错: {str(e)}")
-    finally:
-        conn.close()
+
+
+# 后台写入队列配置
+WRITE_QUEUE_SIZE = 1000       # 队列中最多等待写入的语句数
+WRITE_BATCH_SIZE = 500        # 每个事务最多写入的语句数
+WRITE_FLUSH_INTERVAL = 0.5    # 秒，收集一批语句的最长等待时间
+WRITE_ENQUEUE_TIMEOUT = 2.0   # 秒，队列满时提交方最多等待的时间
+WRITE_RETRIES = 4             # 遇到 "database is locked" 等操作错误时的重试次数
+WRITE_RETRY_DELAY = 0.5       # 秒，首次重试前的等待时间，之后每次翻倍
+
+
+class WriteBehindQueue:
+    """后台写入队列
+
+    各会话提交的写入语句放入有界队列后立即返回，由单个写入线程按批在一个事务中提交，
+    避免多个会话同时写库互相阻塞或出现 "database is locked"。
+    队列满时提交方最多等待 enqueue_timeout 秒（反压），仍然满则返回 False；
+    进程退出时会先写完队列中剩余的语句。
+
+    其他进程（如后台采集）持有写锁时整批退避重试，重试用尽才计为失败；
+    批内有无法写入的语句时逐条重写，只丢弃出错的语句。
+    """
+
+    def __init__(self, maxsize=WRITE_QUEUE_SIZE, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, enqueue_timeout=WRITE_ENQUEUE_TIMEOUT,
+                 retries=WRITE_RETRIES, retry_delay=WRITE_RETRY_DELAY):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._stats = {'submitted': 0, 'written': 0, 'batches': 0, 'failed': 0, 'rejected': 0,
+                       'retries': 0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_event.clear()
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, sql, params, on_done=None):
+        """提交一条写入语句，成功放入队列返回 True
+
+        on_done(success) 在该语句写入成功或最终失败后由写入线程调用。
+        """
+        self._ensure_started()
+        try:
+            self._queue.put((sql, params, on_done), timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._lock:
+                self._stats['rejected'] += 1
+            return False
+        with self._lock:
+            self._stats['submitted'] += 1
+        return True
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, items):
+        """在一个事务中写入，遇到 OperationalError（如其他进程持有写锁）时退避重试，重试用尽后抛出"""
+        # 连续的相同语句合并为一次 executemany，保持提交顺序（同一天多次写入以最后一次为准）
+        groups = []
+        for sql, params, _ in items:
+            if groups and groups[-1][0] == sql:
+                groups[-1][1].append(params)
+            else:
+                groups.append((sql, [params]))
+
+        for attempt in range(self.retries + 1):
+            try:
+                with get_connection() as conn:  # 失败时归还连接前会回滚未提交的事务
+                    for sql, rows in groups:
+                        conn.executemany(sql, rows)
+                    conn.commit()
+                return
+            except sqlite3.OperationalError as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning("后台写入 %d 条数据失败（%s），%.1f 秒后重试", len(items), e, delay)
+                with self._lock:
+                    self._stats['retries'] += 1
+                time.sleep(delay)
+
+    def _write(self, batch):
+        try:
+            try:
+                self._commit(batch)
+                results = [True] * len(batch)
+                with self._lock:
+                    self._stats['batches'] += 1
+            except sqlite3.OperationalError:
+                # 重试用尽，数据库持续不可写，整批计为失败
+                logger.exception("后台写入 %d 条数据失败", len(batch))
+                results = [False] * len(batch)
+            except Exception:
+                # 批内有无法写入的语句，逐条写入以隔离出错的语句
+                results = []
+                for item in batch:
+                    try:
+                        self._commit([item])
+                        results.append(True)
+                    except Exception:
+                        logger.exception("后台写入失败，已跳过: %s", item[1])
+                        results.append(False)
+
+            with self._lock:
+                self._stats['written'] += sum(results)
+                self._stats['failed'] += len(results) - sum(results)
+            for (_, _, on_done), success in zip(batch, results):
+                if on_done is not None:
+                    try:
+                        on_done(success)
+                    except Exception:
+                        logger.exception("写入回调出错")
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def _run(self):
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if batch:
+                self._write(batch)
+
+    def flush(self, timeout=None):
+        """等待队列中已提交的语句全部写入，返回是否在超时前完成"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if self._thread is None or not self._thread.is_alive():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10):
+        """写完剩余语句后停止写入线程"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, pending=self._queue.qsize())
+
+
+write_queue = WriteBehindQueue()
+atexit.register(write_queue.close)
+
+
+def save_gold_price(date, international_price_usd, international_price_cny,
+                    china_price_cny, usd_cny_rate, premium_rate, on_saved=None):
+    """保存黄金价格数据到数据库，同一天的数据会被覆盖
+
+    写入由后台线程批量提交，页面渲染不等待磁盘写入；
+    写入队列持续满载时改为直接写入。on_saved(success) 在写入完成或最终失败后调用。
+    """
+    params = (date_to_day(date), date, international_price_usd, international_price_cny,
+              china_price_cny, usd_cny_rate, premium_rate)
+    if write_queue.submit(UPSERT_GOLD_PRICE, params, on_saved):
+        return
+
+    with get_connection() as conn:
+        try:
+            conn.execute(UPSERT_GOLD_PRICE, params)
+            conn.commit()
+            st.success("数据已成功保存到数据库")
+            success = True
+        except Exception as e:
+            st.error(f"保存数据时出错: {str(e)}")
+            success = False
+    if on_saved is not None:
+        on_saved(success)
 
 
 def get_gold_prices(start_date=None, end_date=None):
     """获取指定日期范围内的黄金价格数据"""
-    conn = sqlite3.connect('gold_prices.db')
-
-    try:
-        query = "SELECT * FROM gold_prices"
-        params = []
-
-        if start_date and end_date:
-            query += " WHERE date BETWEEN ? AND ?"
-            params.extend([start_date, end_date])
-        elif start_date:
-            query += " WHERE date >= ?"
-            params.append(start_date)
-        elif end_date:
-            query += " WHERE date <= ?"
-            params.append(end_date)
-
-        query += " ORDER BY date DESC"
-
-        df = pd.read_sql_query(query, conn, params=params)
-        return df
-    except Exception as e:
-        st.error(f"获取数据时出错: {str(e)}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        try:
+            query = "SELECT * FROM gold_prices"
+            params = []
+
+            if start_date and end_date:
+                query += " WHERE day BETWEEN ? AND ?"
+                params.extend([date_to_day(start_date), date_to_day(end_date)])
+            elif start_date:
+                query += " WHERE day >= ?"
+                params.append(date_to_day(start_date))
+            elif end_date:
+                query += " WHERE day <= ?"
+                params.append(date_to_day(end_date))
+
+            query += " ORDER BY day DESC"
+
+            df = pd.read_sql_query(query, conn, params=params)
+            return df
+        except Exception as e:
+            st.error(f"获取数据时出错: {str(e)}")
+            return pd.DataFrame()
 
 
 def get_latest_gold_price():
     """获取最新的黄金价格数据"""
-    conn = sqlite3.connect('gold_prices.db')
-
-    try:
-        query = "SELECT * FROM gold_prices ORDER BY date DESC LIMIT 1"
-        df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        st.error(f"获取最新数据时出错: {str(e)}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        try:
+            query = "SELECT * FROM gold_prices ORDER BY day DESC LIMIT 1"
+            df = pd.read_sql_query(query, conn)
+            return df
+        except Exception as e:
+            st.error(f"获取最新数据时出错: {str(e)}")
+            return pd.DataFrame()
 
 
 def get_price_history(days=30):
     """获取最近N天的价格历史"""
-    conn = sqlite3.connect('gold_prices.db')
-
-    try:
-        query = f"SELECT * FROM gold_prices ORDER BY date DESC LIMIT {days}"
-        df = pd.read_sql_query(query, conn)
-        return df
-    except Exception as e:
-        st.error(f"获取历史数据时出错: {str(e)}")
-        return pd.DataFrame()
-    finally:
-        conn.close()
+    with get_connection() as conn:
+        try:
+            # 使用参数而不是拼接SQL，便于复用预编译语句
+            query = "SELECT * FROM gold_prices ORDER BY day DESC LIMIT ?"
+            df = pd.read_sql_query(query, conn, params=(int(days),))
+            return df
+        except Exception as e:
+            st.error(f"获取历史数据时出错: {str(e)}")
+            return pd.DataFrame()
 
 
 def clear_old_data(days_to_keep=365):
     """清理超过指定天数的旧数据"""
-    conn = sqlite3.connect('gold_prices.db')
-    cursor = conn.cursor()
+    with get_connection() as conn:
+        try:
+            # 计算要保留的日期
+            cutoff_date = (datetime.now() -
+                           pd.Timedelta(days=days_to_keep)).strftime('%Y-%m-%d')
 
-    try:
-        # 计算要保留的日期
-        cutoff_date = (datetime.now() -
-                       pd.Timedelta(days=days_to_keep)).strftime('%Y-%m-%d')
+            conn.execute(
+                "DELETE FROM gold_prices WHERE day < ?", (date_to_day(cutoff_date),))
+            conn.commit()
+            st.success(f"已清理{cutoff_date}之前的数据")
+        except Exception as e:
+            st.error(f"清理数据时出错: {str(e)}")
 
-        cursor.execute(
-            "DELETE FROM gold_prices WHERE date < ?", (cutoff_date,))
-        conn.commit()
-        st.success(f"已清理{cutoff_date}之前的数据")
-    except Exception as e:
-        st.error(f"清理数据时出错: {str(e)}")
-    finally:
-        conn.close()
+
+def get_history_coverage(name='gold_history'):
+    """获取已同步的历史数据日期区间，返回 (start_date, end_date) 或 None"""
+    with get_connection() as conn:
+        try:
+            row = conn.execute(
+                "SELECT start_date, end_date FROM history_sync WHERE name = ?", (name,)).fetchone()
+            return (row[0], row[1]) if row else None
+        except Exception as e:
+            st.error(f"获取同步记录时出错: {str(e)}")
+            return None
+
+
+def update_history_coverage(start_date, end_date, name='gold_history'):
+    """更新已同步的历史数据日期区间"""
+    with get_connection() as conn:
+        try:
+            conn.execute('''
+            INSERT OR REPLACE INTO history_sync (name, start_date, end_date, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ''', (name, start_date, end_date))
+            conn.commit()
+        except Exception as e:
+            st.error(f"更新同步记录时出错: {str(e)}")
+
+
+# 批量写入时每次 executemany 的行数
+BULK_CHUNK_SIZE = 50000
+
+PRICE_COLUMNS = ['international_price_usd', 'international_price_cny',
+                 'china_price_cny', 'usd_cny_rate', 'premium_rate']
+
+
+def _write_gold_prices(conn, df, chunk_size):
+    """在当前事务中分块写入（更新）DataFrame 中的黄金价格数据"""
+    days = dates_to_days(df['date'])
+    dates = np.datetime_as_string(days.astype('datetime64[D]'), unit='D')
+    columns = [days, dates] + [df[col].to_numpy(dtype=float)
+                               for col in PRICE_COLUMNS]
+
+    for start in range(0, len(df), chunk_size):
+        # tolist() 一次性转换为 Python 标量，比逐行转换快得多
+        chunk = [col[start:start + chunk_size].tolist() for col in columns]
+        conn.executemany(UPSERT_GOLD_PRICE, zip(*chunk))
+
+
+def save_gold_prices_bulk(df, chunk_size=BULK_CHUNK_SIZE):
+    """在一个事务中批量写入整个 DataFrame，返回写入行数
+
+    df 需包含 date 列和各价格列，同一天已有的数据会被覆盖。
+    不输出界面提示，出错时回滚并抛出异常，由调用方处理。
+    """
+    if df is None or df.empty:
+        return 0
+
+    with get_connection() as conn:
+        try:
+            _write_gold_prices(conn, df, chunk_size)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(df)
+
+
+def save_history_rows(df, start_date, end_date):
+    """用新同步的历史数据替换 [start_date, end_date) 区间内的记录，返回写入行数
+
+    写入失败时回滚并抛出异常，由调用方决定是否推进同步记录。
+    """
+    with get_connection() as conn:
+        try:
+            conn.execute(
+                "DELETE FROM gold_prices WHERE day >= ? AND day < ?",
+                (date_to_day(start_date), date_to_day(end_date)))
+            _write_gold_prices(conn, df, BULK_CHUNK_SIZE)
+            conn.commit()
+            return len(df)
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def save_indicator_state(name, state):
+    """保存增量指标状态（可序列化为 JSON 的字典）"""
+    with get_connection() as conn:
+        try:
+            conn.execute('''
+            INSERT OR REPLACE INTO indicator_state (name, state, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''', (name, json.dumps(state)))
+            conn.commit()
+        except Exception as e:
+            st.error(f"保存指标状态时出错: {str(e)}")
+
+
+def load_indicator_state(name):
+    """读取增量指标状态，不存在返回 None"""
+    with get_connection() as conn:
+        try:
+            row = conn.execute(
+                "SELECT state FROM indicator_state WHERE name = ?", (name,)).fetchone()
+            return json.loads(row[0]) if row else None
+        except Exception as e:
+            st.error(f"读取指标状态时出错: {str(e)}")
+            return None
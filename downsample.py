@@ -0,0 +1,84 @@
+"""图表降采样
+
+数据点远多于图表像素时，把全部点发送到浏览器只会增加 Plotly JSON 体积和渲染时间。
+这里使用 Largest-Triangle-Three-Buckets (LTTB) 算法选取保留视觉形状（包括峰值和谷值）的点。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# 图表绘图区宽度（像素），每像素保留的点数
+CHART_WIDTH_PX = int(os.environ.get("GOLD_CHART_WIDTH", "1200"))
+POINTS_PER_PX = 2
+
+
+def max_points_for_width(width_px=CHART_WIDTH_PX, points_per_px=POINTS_PER_PX):
+    """根据图表宽度计算最多显示的数据点数"""
+    return max(int(width_px * points_per_px), 3)
+
+
+def lttb_indices(x, y, threshold):
+    """LTTB 降采样，返回保留点的下标（升序，包含首尾两点）
+
+    x 需单调递增；点数不超过 threshold 时返回全部下标。
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # 首尾两点固定，中间 n-2 个点均分为 threshold-2 个桶
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    selected = np.empty(threshold, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的平均点（最后一个桶使用末尾点）
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_end].mean()
+            avg_y = y[next_start:next_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+
+        # 选取与上一选中点、下一桶平均点构成三角形面积最大的点
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                      (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+
+    return selected
+
+
+def downsample_frame(df, x_col, y_cols, max_points):
+    """对 DataFrame 降采样，返回 (降采样后的数据, 省略的点数)
+
+    每个 y 列分别做 LTTB 后取下标并集，保证每条曲线的峰谷都被保留；
+    空值（如均线开头）不参与选点。
+    """
+    n = len(df)
+    if max_points is None or n <= max_points:
+        return df, 0
+
+    x = df[x_col]
+    if x.dtype.kind not in 'iuf':
+        # 日期列（字符串或日期类型）转换为数值
+        x = pd.to_datetime(x).to_numpy(dtype='datetime64[ns]').astype('int64')
+    x = np.asarray(x, dtype=float)
+
+    budget = max(max_points // len(y_cols), 3)
+    keep = [np.array([0, n - 1])]
+    for col in y_cols:
+        y = df[col].to_numpy(dtype=float)
+        valid = np.flatnonzero(np.isfinite(y))
+        if len(valid) == 0:
+            continue
+        keep.append(valid[lttb_indices(x[valid], y[valid], budget)])
+
+    indices = np.unique(np.concatenate(keep))
+    return df.iloc[indices], n - len(indices)
@@ -1,64 +1,285 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 import numpy as np
 from datetime import datetime, timedelta
 import requests
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
-from database import init_db, save_gold_price, get_latest_gold_price, get_price_history
+from rate_limiter import rate_limiter
+from price_providers import ProviderError, get_provider
+from price_store import get_store
+from cache import RangeCache, cache_report, tiered_cache
+from data_version import frame_version, stamp
+from live_ticker import LIVE_INTERVAL, LiveTicker, show_live_panel
+from downsample import downsample_frame, max_points_for_width
+from indicators import compute_indicators, indicator_grids, DEFAULT_EXTRAS, StreamingIndicators
+from database import (init_db, save_gold_price, get_latest_gold_price, get_price_history,
+                      get_gold_prices, get_history_coverage, update_history_coverage,
+                      save_history_rows, write_queue, load_indicator_state,
+                      save_indicator_state)
+import os
 import time
-import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import scipy.stats as stats
 from statsmodels.tsa.seasonal import seasonal_decompose
 
 # 初始化数据库
 init_db()
 
-# MetalpriceAPI配置
-METAL_PRICE_API_KEY = "YOUR_API_KEY"  # 需要替换为您的API密钥
-METAL_PRICE_API_BASE_URL = "https://api.metalpriceapi.com/v1"
 
-
-def safe_download(symbol, retries=3, delay=2):
-    """安全地下载数据，包含重试和延时"""
+# 黄金价格数据源：(代码, 换算倍数)，优先尝试黄金期货和现货
+PRIMARY_GOLD_SYMBOLS = [
+    ("GC=F", 1),      # 黄金期货
+    ("XAUUSD=X", 1),  # 黄金现货
+]
+
+# 备用的ETF数据源，价格乘以倍数换算为每盎司价格
+BACKUP_GOLD_SYMBOLS = [
+    ("GLD", 10),    # SPDR黄金ETF (1/10盎司)
+    ("IAU", 100),   # iShares黄金ETF (1/100盎司)
+    ("SGOL", 10),   # Aberdeen Standard Physical Gold Shares ETF (1/10盎司)
+    ("GLDM", 50),   # SPDR Gold MiniShares Trust (1/50盎司)
+    ("BAR", 50),    # GraniteShares Gold Trust (1/50盎司)
+    ("AAAU", 10),   # Goldman Sachs Physical Gold ETF (1/10盎司)
+]
+
+# 汇率数据源，按优先级排列
+EXCHANGE_SYMBOLS = [
+    "CNY=X",     # 美元/人民币
+    "USDCNY=X",  # 美元/人民币 (替代)
+    "CNH=F"      # 离岸人民币期货
+]
+
+# 数据采集方式：inline（页面按需获取）/ background（进程内后台线程）/ external（独立进程），见 ingest.py
+INGEST_MODE = os.environ.get("GOLD_INGEST_MODE", "inline").lower()
+
+# 缓存上限：分析结果以数据版本为键，同时有效的版本很少；Plotly 图表对象较大，只保留少量；
+# 历史数据按字节限制，避免长期运行的服务内存无限增长
+ANALYTICS_CACHE_ENTRIES = 16
+FIGURE_CACHE_ENTRIES = 8
+HISTORY_CACHE_BYTES = 64 * 1024 * 1024
+
+# 并发请求配置：上一梯队在 HEDGE_DELAY 秒内没有返回有效结果时启动下一梯队，
+# 超过 RACE_DEADLINE 秒时返回已有的最优结果，仍无结果则放弃
+HEDGE_DELAY = 2.0
+RACE_DEADLINE = 30.0
+
+
+def safe_download(symbol, retries=3, quiet=False):
+    """安全地下载数据，包含限流、指数退避重试和熔断
+
+    quiet=True 时不输出界面提示，用于在后台线程中调用。
+    """
+    provider = get_provider()
     for attempt in range(retries):
-        try:
-            # 随机延时避免被检测为爬虫
-            time.sleep(delay + random.uniform(0.5, 1.5))
-
-            # 设置请求头，模拟浏览器行为
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
+        # 预算充足时立即发出请求，该代码熔断中则直接放弃
+        if provider.rate_limited and not rate_limiter.acquire(symbol):
+            if not quiet:
+                st.warning(f"{symbol} 近期连续失败，暂停请求")
+            break
 
-            # 使用download函数获取数据
+        try:
             # 设置较短的超时时间，避免长时间等待
-            data = yf.download(
+            data = provider.download(
                 symbol,
                 start=(datetime.now() - timedelta(days=5)
                        ).strftime('%Y-%m-%d'),
                 end=datetime.now().strftime('%Y-%m-%d'),
-                progress=False,
-                ignore_tz=True,
-                threads=False,  # 禁用多线程可能更稳定
                 timeout=10
             )
 
             if not data.empty:
+                rate_limiter.record_success(symbol)
                 return data
+            rate_limiter.record_failure(symbol)
 
         except Exception as e:
+            rate_limiter.record_failure(symbol)
             if attempt < retries - 1:  # 如果还有重试次数
-                st.warning(f"第{attempt + 1}次尝试失败: {str(e)}，等待后重试...")
-                time.sleep(delay * (attempt + 1))  # 递增延时
-            else:
+                if not quiet:
+                    st.warning(f"第{attempt + 1}次尝试失败: {str(e)}，等待后重试...")
+            elif not quiet:
                 st.error(f"下载失败: {str(e)}")
+
+        if attempt < retries - 1:
+            rate_limiter.backoff(attempt)  # 指数退避
     return pd.DataFrame()  # 返回空DataFrame表示失败
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
+def race_symbols(fetch, tiers, hedge_delay=HEDGE_DELAY, deadline=RACE_DEADLINE):
+    """并发请求多个数据源，按优先级返回有效结果
+
+    tiers 为按优先级排列的候选梯队。第一梯队立即并发请求；
+    若 hedge_delay 秒内没有有效结果，或当前梯队已全部失败，则启动下一梯队。
+    fetch(candidate) 返回 None 表示该数据源无效。
+    与逐个尝试的回退语义一致：低优先级的结果先返回时，继续等待仍在进行中的
+    高优先级请求，直到它们失败或超过 deadline 秒。
+    返回 (candidate, value)，全部失败或超时返回 (None, None)。
+    """
+    priority = {}
+    for tier in tiers:
+        for candidate in tier:
+            priority.setdefault(candidate, len(priority))
+
+    executor = ThreadPoolExecutor(max_workers=max(len(priority), 1))
+    pending = {}
+    best = None  # 目前优先级最高的有效结果 (candidate, value)
+    next_tier = 0
+    start = time.monotonic()
+    next_launch = start
+
+    def outranks(candidate):
+        return best is None or priority[candidate] < priority[best[0]]
+
+    try:
+        while True:
+            # 没有更高优先级的请求在进行中时，当前最优结果即为最终结果
+            if best is not None and not any(outranks(c) for c in pending.values()):
+                return best
+
+            now = time.monotonic()
+            # 已有有效结果时不再启动后续梯队（后续梯队优先级更低）
+            if best is None and next_tier < len(tiers) and (now >= next_launch or not pending):
+                for candidate in tiers[next_tier]:
+                    pending[executor.submit(fetch, candidate)] = candidate
+                next_tier += 1
+                next_launch = now + hedge_delay
+
+            remaining = deadline - (now - start)
+            if not pending or remaining <= 0:
+                return best if best is not None else (None, None)
+
+            timeout = remaining
+            if best is None and next_tier < len(tiers):
+                timeout = min(timeout, max(next_launch - now, 0))
+
+            done, _ = wait(pending, timeout=timeout,
+                           return_when=FIRST_COMPLETED)
+
+            for future in done:
+                candidate = pending.pop(future)
+                try:
+                    value = future.result()
+                except Exception:
+                    value = None
+                if value is not None and outranks(candidate):
+                    best = (candidate, value)
+    finally:
+        # 所有请求提交后都已在运行，无法取消，未完成的请求在后台自然结束
+        executor.shutdown(wait=False)
+
+
+# 最新行情的批量请求结果，供 fetch_gold_price 和 fetch_usd_cny_rate 共享
+QUOTES_MAX_AGE = 60  # 秒
+DEFAULT_USD_CNY_RATE = 7.2  # 所有汇率数据源都失败时使用的默认汇率（不缓存）
+_latest_quotes = {'time': 0.0, 'data': {}}
+_latest_quotes_lock = threading.Lock()
+
+
+def get_latest_quotes(max_age=QUOTES_MAX_AGE):
+    """一次请求获取黄金、备用ETF和汇率的近期行情，max_age 秒内复用上次结果"""
+    with _latest_quotes_lock:
+        if time.monotonic() - _latest_quotes['time'] < max_age:
+            return _latest_quotes['data']
+
+        symbols = [symbol for symbol, _ in PRIMARY_GOLD_SYMBOLS + BACKUP_GOLD_SYMBOLS] + \
+            EXCHANGE_SYMBOLS
+        try:
+            data = download_history_many(
+                symbols,
+                (datetime.now() - timedelta(days=5)).strftime('%Y-%m-%d'),
+                datetime.now().strftime('%Y-%m-%d')
+            )
+        except Exception:
+            data = {}
+
+        if any(not bars.empty for bars in data.values()):
+            _latest_quotes['time'] = time.monotonic()
+            _latest_quotes['data'] = data
+        return data
+
+
+def _gold_price_from_bars(data, multiplier):
+    """从日线数据提取每盎司黄金价格，数据无效返回 None"""
+    if data is None or data.empty:
+        return None
+    close = data['Close'].dropna()
+    if close.empty:
+        return None
+    return float(close.iloc[-1].item()) * multiplier  # 使用.item()避免警告
+
+
+def _rate_from_bars(symbol, data):
+    """从日线数据提取美元兑人民币汇率，数据无效返回 None"""
+    if data is None or data.empty:
+        return None
+    close = data['Close'].dropna()
+    if close.empty:
+        return None
+    return _rate_from_price(symbol, float(close.iloc[-1].item()))  # 使用.item()避免警告
+
+
+def _rate_from_price(symbol, price):
+    """将报价换算为美元兑人民币汇率"""
+    if symbol == "CNH=F":
+        return 1 / price  # 转换为直接汇率
+    return price
+
+
+def _fetch_gold_candidate(candidate):
+    """从单个数据源获取黄金价格，返回 (每盎司价格, 原始数据) 或 None"""
+    symbol, multiplier = candidate
+    data = safe_download(symbol, quiet=True)
+    current_price = _gold_price_from_bars(data, multiplier)
+    if current_price is None:
+        return None
+    return current_price, data
+
+
+def _fetch_rate_candidate(symbol):
+    """从单个数据源获取汇率，返回汇率或 None"""
+    return _rate_from_bars(symbol, safe_download(symbol, quiet=True))
+
+
+def fetch_gold_price():
+    """获取黄金价格，返回 (价格, 原始数据, 数据源代码)
+
+    先使用批量请求的结果按优先级选择；批量请求失败时并发逐个请求各数据源。
+    """
+    quotes = get_latest_quotes()
+    for symbol, multiplier in PRIMARY_GOLD_SYMBOLS + BACKUP_GOLD_SYMBOLS:
+        data = quotes.get(symbol)
+        current_price = _gold_price_from_bars(data, multiplier)
+        if current_price is not None:
+            return current_price, data, symbol
+
+    candidate, value = race_symbols(
+        _fetch_gold_candidate, [PRIMARY_GOLD_SYMBOLS, BACKUP_GOLD_SYMBOLS])
+    if candidate is None:
+        return None, None, None
+    current_price, data = value
+    return current_price, data, candidate[0]
+
+
+def fetch_usd_cny_rate():
+    """获取美元兑人民币汇率，返回 (汇率, 数据源代码)
+
+    先使用批量请求的结果按优先级选择；批量请求失败时并发逐个请求各数据源。
+    """
+    quotes = get_latest_quotes()
+    for symbol in EXCHANGE_SYMBOLS:
+        rate = _rate_from_bars(symbol, quotes.get(symbol))
+        if rate is not None:
+            return rate, symbol
+
+    symbol, rate = race_symbols(_fetch_rate_candidate, [EXCHANGE_SYMBOLS])
+    return rate, symbol
+
+
+@tiered_cache(ttl=24*3600, max_entries=4,
+              validate=lambda result: result[0] is not None)  # 内存+磁盘缓存24小时
 def get_gold_data():
     """获取黄金价格数据"""
     try:
@@ -70,57 +291,16 @@ def get_gold_data():
                 st.success("使用今日缓存的黄金价格数据")
                 return latest_data['international_price_usd'].iloc[0], None
 
-        # 尝试从Yahoo Finance获取数据
-        st.info("正在从Yahoo Finance获取黄金价格数据...")
-
-        # 优先尝试黄金期货和现货
-        primary_symbols = [
-            "GC=F",     # 黄金期货
-            "XAUUSD=X"  # 黄金现货
-        ]
-
-        # 备用的ETF数据源
-        backup_symbols = [
-            ("GLD", 10),    # SPDR黄金ETF (1/10盎司)
-            ("IAU", 100),   # iShares黄金ETF (1/100盎司)
-            ("SGOL", 10),   # Aberdeen Standard Physical Gold Shares ETF (1/10盎司)
-            ("GLDM", 50),   # SPDR Gold MiniShares Trust (1/50盎司)
-            ("BAR", 50),    # GraniteShares Gold Trust (1/50盎司)
-            ("AAAU", 10),   # Goldman Sachs Physical Gold ETF (1/10盎司)
-        ]
-
-        # 首先尝试主要数据源
-        for symbol in primary_symbols:
-            st.info(f"尝试从{symbol}获取数据...")
-            data = safe_download(symbol)
+        # 并发请求主要数据源，必要时启动ETF备用数据源
+        st.info(f"正在从{get_provider().label}获取黄金价格数据...")
+        current_price, data, symbol = fetch_gold_price()
 
-            if not data.empty:
-                try:
-                    current_price = float(
-                        data['Close'].iloc[-1].item())  # 使用.item()避免警告
-                    st.success(f"成功从{symbol}获取黄金价格数据: ${current_price:.2f}/盎司")
-                    return current_price, data
-                except Exception as e:
-                    st.warning(f"数据格式错误: {str(e)}")
-                    continue
-
-        # 如果主要数据源都失败，尝试ETF
-        for symbol, multiplier in backup_symbols:
-            st.info(f"尝试从{symbol}获取数据...")
-            data = safe_download(symbol)
+        if current_price is None:
+            st.error("所有数据源都获取失败")
+            return None, None
 
-            if not data.empty:
-                try:
-                    current_price = float(
-                        data['Close'].iloc[-1].item()) * multiplier  # 使用.item()避免警告
-                    st.success(f"成功从{symbol}获取黄金价格数据: ${current_price:.2f}/盎司")
-                    return current_price, data
-                except Exception as e:
-                    st.warning(f"数据格式错误: {str(e)}")
-                    continue
-
-        st.error("所有数据源都获取失败")
-        return None, None
+        st.success(f"成功从{symbol}获取黄金价格数据: ${current_price:.2f}/盎司")
+        return current_price, data
 
     except Exception as e:
         st.error(f"获取黄金数据时出错: {str(e)}")
@@ -128,225 +308,297 @@ def get_gold_data():
         return None, None
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
+# 返回值带有是否为默认汇率的标记，使用默认汇率时不缓存；
+# 返回值格式与早期版本（只有汇率）不同，使用新的缓存命名空间
+@tiered_cache(ttl=24*3600, max_entries=4, namespace='gold_analysis.usd_cny_rate',
+              validate=lambda result: not result[1])  # 内存+磁盘缓存24小时
 def get_usd_cny_rate():
-    """获取美元兑人民币汇率"""
+    """获取美元兑人民币汇率，返回 (汇率, 是否为默认汇率)"""
     try:
         st.info("正在获取美元兑人民币汇率...")
+        rate, symbol = fetch_usd_cny_rate()
 
-        # 尝试不同的汇率数据源
-        exchange_symbols = [
-            "CNY=X",     # 美元/人民币
-            "USDCNY=X",  # 美元/人民币 (替代)
-            "CNH=F"      # 离岸人民币期货
-        ]
-
-        for symbol in exchange_symbols:
-            st.info(f"尝试从{symbol}获取汇率...")
-            data = safe_download(symbol)
+        if rate is None:
+            # 如果所有API都失败，使用备用值
+            st.warning(f"无法获取实时汇率，使用默认汇率{DEFAULT_USD_CNY_RATE}")
+            return DEFAULT_USD_CNY_RATE, True
 
-            if not data.empty:
-                try:
-                    # 使用.item()避免警告
-                    rate = float(data['Close'].iloc[-1].item())
-                    if symbol == "CNH=F":
-                        rate = 1 / rate  # 转换为直接汇率
-                    st.success(f"成功从{symbol}获取汇率数据: {rate:.4f}")
-                    return rate
-                except Exception as e:
-                    st.warning(f"数据格式错误: {str(e)}")
-                    continue
-
-        # 如果所有API都失败，使用备用值
-        st.warning("无法获取实时汇率，使用默认汇率7.2")
-        return 7.2
+        st.success(f"成功从{symbol}获取汇率数据: {rate:.4f}")
+        return rate, False
 
     except Exception as e:
         st.error(f"获取汇率数据时出错: {str(e)}")
-        st.info("使用默认汇率7.2")
-        return 7.2
+        st.info(f"使用默认汇率{DEFAULT_USD_CNY_RATE}")
+        return DEFAULT_USD_CNY_RATE, True
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
-def get_historical_gold_data(days):
-    """获取历史黄金价格数据"""
-    try:
-        # 创建调试信息的expander，默认收起
-        debug_expander = st.expander("调试信息（点击展开）", expanded=False)
+# 历史数据的标准列
+HISTORY_COLUMNS = ['date', 'international_price_usd', 'international_price_cny',
+                   'china_price_cny', 'usd_cny_rate', 'premium_rate']
 
-        # 确保结束日期不超过今天
-        current_date = datetime.now()
-        end_date = current_date.replace(
-            hour=0, minute=0, second=0, microsecond=0)
-        start_date = end_date - timedelta(days=days)
 
-        debug_expander.info(
-            f"获取从 {start_date.strftime('%Y-%m-%d')} 到 {end_date.strftime('%Y-%m-%d')} 的历史数据")
+def download_history_many(symbols, start_date, end_date):
+    """一次请求批量下载 [start_date, end_date) 区间内多个代码的日线数据，返回 {代码: 数据}
 
-        # 尝试获取黄金价格历史数据
-        try:
-            gold_data = yf.download(
-                "GC=F",  # 黄金期货
-                start=start_date.strftime('%Y-%m-%d'),
-                end=end_date.strftime('%Y-%m-%d'),
-                progress=False
-            )
+    请求失败或熔断中时抛出异常；请求成功但区间内没有交易日（周末、节假日）时
+    返回空数据，不计为失败，避免休市区间触发熔断。
+    """
+    provider = get_provider()
+    if not provider.rate_limited:
+        return provider.download_many(symbols, start_date, end_date)
 
-            # 调试信息
-            debug_expander.info(f"获取到黄金数据: {len(gold_data)}条记录")
-            if not gold_data.empty:
-                debug_expander.info(
-                    f"黄金数据日期范围: {gold_data.index.min().strftime('%Y-%m-%d')} 到 {gold_data.index.max().strftime('%Y-%m-%d')}")
-                debug_expander.info(f"黄金数据列: {gold_data.columns.tolist()}")
-                # 安全地检查和显示数据类型
-                if 'Close' in gold_data.columns:
-                    try:
-                        # 使用dtypes字典而不是直接访问dtype属性
-                        debug_expander.info(
-                            f"黄金收盘价数据类型: {gold_data.dtypes['Close']}")
-                    except Exception as e:
-                        debug_expander.warning(f"无法获取黄金收盘价数据类型: {str(e)}")
-                # 显示部分样本数据
-                debug_expander.info(f"黄金数据样本: \n{gold_data.head(2)}")
-
-            if gold_data.empty:
-                debug_expander.warning("无法获取黄金期货数据，尝试获取黄金现货数据...")
-                gold_data = yf.download(
-                    "XAUUSD=X",  # 黄金现货
-                    start=start_date.strftime('%Y-%m-%d'),
-                    end=end_date.strftime('%Y-%m-%d'),
-                    progress=False
-                )
-
-                # 调试信息
-                debug_expander.info(f"获取到黄金现货数据: {len(gold_data)}条记录")
-                if not gold_data.empty:
-                    debug_expander.info(
-                        f"黄金现货数据日期范围: {gold_data.index.min().strftime('%Y-%m-%d')} 到 {gold_data.index.max().strftime('%Y-%m-%d')}")
-        except Exception as e:
-            st.error(f"获取黄金价格数据失败: {str(e)}")
-            import traceback
-            debug_expander.error(f"获取黄金数据错误详情: {traceback.format_exc()}")
-            return pd.DataFrame()
+    batch_key = ','.join(symbols)
+    if not rate_limiter.acquire(batch_key):
+        raise ProviderError(f"{batch_key} 近期连续失败，暂停请求")
 
-        # 获取汇率历史数据
+    try:
+        data = provider.download_many(symbols, start_date, end_date)
+    except Exception:
+        rate_limiter.record_failure(batch_key)
+        raise
+
+    rate_limiter.record_success(batch_key)
+    return data
+
+
+def missing_history_ranges(start_date, end_date, coverage):
+    """计算 [start_date, end_date) 中尚未同步的日期区间
+
+    已同步区间始终保持连续：请求区间与已同步区间不相邻时，
+    中间的空洞也一并补齐。
+    """
+    if coverage is None:
+        return [(start_date, end_date)]
+
+    covered_start, covered_end = coverage
+    ranges = []
+    if start_date < covered_start:
+        ranges.append((start_date, covered_start))  # 向前补齐
+    if end_date > covered_end:
+        ranges.append((covered_end, end_date))  # 向后追加
+    return ranges
+
+
+def _close_series(data):
+    """提取收盘价序列，兼容 yfinance 返回的多级列索引"""
+    close = data['Close']
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    close = pd.to_numeric(close, errors='coerce')
+    # 去除重复的时间戳，保留最后一条
+    return close[~close.index.duplicated(keep='last')]
+
+
+def align_gold_fx(gold_data, usd_cny_data, premium_rate=1.03):
+    """按日期对齐黄金与汇率数据（向量化），返回标准列的历史数据"""
+    merged = pd.concat({
+        'international_price_usd': _close_series(gold_data),
+        'usd_cny_rate': _close_series(usd_cny_data)
+    }, axis=1, join='inner').dropna().sort_index()
+
+    gold_price_usd = merged['international_price_usd'].to_numpy(dtype=float)
+    usd_cny_rate = merged['usd_cny_rate'].to_numpy(dtype=float)
+    gold_price_cny = gold_price_usd * usd_cny_rate
+
+    df = pd.DataFrame({
+        'date': np.datetime_as_string(merged.index.values.astype('datetime64[ns]'), unit='D'),
+        'international_price_usd': gold_price_usd,
+        'international_price_cny': gold_price_cny,
+        'china_price_cny': gold_price_cny * premium_rate,  # 假设3%溢价
+        'usd_cny_rate': usd_cny_rate,
+        'premium_rate': np.full(len(merged), premium_rate)
+    })
+    return df
+
+
+def fetch_history_range(start_date, end_date, debug_expander):
+    """从数据源获取 [start_date, end_date) 区间的黄金与汇率数据并对齐
+
+    请求失败时抛出异常；区间内没有可对齐的交易日时返回空数据。
+    """
+    # 黄金期货、黄金现货和汇率一次批量请求
+    data = download_history_many(
+        ["GC=F", "XAUUSD=X", "CNY=X"], start_date, end_date)
+
+    gold_data = data.get("GC=F", pd.DataFrame())  # 黄金期货
+    debug_expander.info(f"获取到黄金数据: {len(gold_data)}条记录")
+
+    if gold_data.empty:
+        debug_expander.warning("无法获取黄金期货数据，使用黄金现货数据...")
+        gold_data = data.get("XAUUSD=X", pd.DataFrame())  # 黄金现货
+        debug_expander.info(f"获取到黄金现货数据: {len(gold_data)}条记录")
+
+    usd_cny_data = data.get("CNY=X", pd.DataFrame())  # 美元兑人民币汇率
+    debug_expander.info(f"获取到汇率数据: {len(usd_cny_data)}条记录")
+
+    if gold_data.empty and usd_cny_data.empty:
+        debug_expander.info(f"{start_date} 到 {end_date} 没有交易数据（休市）")
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+    if gold_data.empty or usd_cny_data.empty:
+        # 只有一侧有数据，说明另一侧请求失败而不是休市，不能记为已同步
+        missing = "黄金" if gold_data.empty else "汇率"
+        raise ProviderError(f"{start_date} 到 {end_date} 缺少{missing}数据")
+
+    # 过滤掉请求区间之外的日期（包括未来日期）
+    start_ts, end_ts = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    gold_data = gold_data[(gold_data.index >= start_ts)
+                          & (gold_data.index < end_ts)]
+    usd_cny_data = usd_cny_data[(usd_cny_data.index >= start_ts)
+                                & (usd_cny_data.index < end_ts)]
+
+    df = align_gold_fx(gold_data, usd_cny_data)
+
+    dropped = len(gold_data) - len(df)
+    if dropped > 0:
+        debug_expander.warning(f"共有 {dropped} 个日期缺少对应的汇率数据或价格无效，已跳过")
+    return df
+
+
+def sync_history(start_date, end_date, debug_expander):
+    """增量同步 [start_date, end_date) 的历史数据到数据库
+
+    只从数据源获取尚未同步的区间，返回是否全部同步成功。
+    """
+    coverage = get_history_coverage()
+    ranges = missing_history_ranges(start_date, end_date, coverage)
+
+    if not ranges:
+        debug_expander.info(f"本地数据库已包含 {start_date} 到 {end_date} 的数据，无需下载")
+        return True
+
+    success = True
+    for range_start, range_end in ranges:
+        debug_expander.info(f"同步缺失区间: {range_start} 到 {range_end}")
         try:
-            usd_cny_data = yf.download(
-                "CNY=X",  # 美元兑人民币汇率
-                start=start_date.strftime('%Y-%m-%d'),
-                end=end_date.strftime('%Y-%m-%d'),
-                progress=False
-            )
-
-            # 调试信息
-            debug_expander.info(f"获取到汇率数据: {len(usd_cny_data)}条记录")
-            if not usd_cny_data.empty:
-                debug_expander.info(
-                    f"汇率数据日期范围: {usd_cny_data.index.min().strftime('%Y-%m-%d')} 到 {usd_cny_data.index.max().strftime('%Y-%m-%d')}")
-                debug_expander.info(f"汇率数据列: {usd_cny_data.columns.tolist()}")
-                # 安全地检查和显示数据类型
-                if 'Close' in usd_cny_data.columns:
-                    try:
-                        # 使用dtypes字典而不是直接访问dtype属性
-                        debug_expander.info(
-                            f"汇率收盘价数据类型: {usd_cny_data.dtypes['Close']}")
-                    except Exception as e:
-                        debug_expander.warning(f"无法获取汇率收盘价数据类型: {str(e)}")
+            history = fetch_history_range(range_start, range_end, debug_expander)
         except Exception as e:
-            st.error(f"获取汇率数据失败: {str(e)}")
-            import traceback
-            debug_expander.error(f"获取汇率数据错误详情: {traceback.format_exc()}")
-            return pd.DataFrame()
+            # 请求失败不推进同步记录，下次再试
+            debug_expander.warning(f"同步 {range_start} 到 {range_end} 失败: {str(e)}")
+            success = False
+            continue
 
-        if gold_data.empty or usd_cny_data.empty:
-            st.error("无法获取完整的历史数据")
-            return pd.DataFrame()
+        # 请求成功但没有数据（休市）时同样推进同步记录，不再重复请求
+        if not history.empty:
+            try:
+                saved = save_history_rows(history, range_start, range_end)
+            except Exception as e:
+                # 写入失败（如数据库被锁定）不推进同步记录，下次重新获取
+                debug_expander.warning(f"保存 {range_start} 到 {range_end} 的数据失败: {str(e)}")
+                success = False
+                continue
+            debug_expander.info(f"写入数据库: {saved}条记录")
+            get_store().append(history)
 
-        # 检查并过滤掉未来日期
-        today = current_date.date()
-        future_dates_gold = [
-            date for date in gold_data.index if date.date() > today]
-        future_dates_cny = [
-            date for date in usd_cny_data.index if date.date() > today]
+        if coverage is None:
+            coverage = (range_start, range_end)
+        else:
+            coverage = (min(coverage[0], range_start),
+                        max(coverage[1], range_end))
+        update_history_coverage(*coverage)
 
-        if future_dates_gold:
-            debug_expander.warning(
-                f"发现并移除黄金数据中的未来日期: {[d.strftime('%Y-%m-%d') for d in future_dates_gold]}")
-            gold_data = gold_data.loc[gold_data.index.date <= today]
+    return success
 
-        if future_dates_cny:
-            debug_expander.warning(
-                f"发现并移除汇率数据中的未来日期: {[d.strftime('%Y-%m-%d') for d in future_dates_cny]}")
-            usd_cny_data = usd_cny_data.loc[usd_cny_data.index.date <= today]
 
-        # 准备数据
-        historical_data = []
-        problem_dates = []
+def history_window(days):
+    """返回最近 days 天的日期区间 [start_date, end_date)，结束日期为今天（不含）"""
+    end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days)
+    return start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
 
-        for date in gold_data.index:
-            try:
-                # 检查该日期是否在汇率数据中
-                if date in usd_cny_data.index:
-                    try:
-                        # 详细记录每一步操作和数据类型
-                        gold_price = gold_data.loc[date, 'Close']
-                        # 只打印一次详细信息，避免刷屏
-                        if len(historical_data) < 2:
-                            debug_expander.info(
-                                f"日期 {date.strftime('%Y-%m-%d')} 的黄金价格原始值: {gold_price}, 类型: {type(gold_price)}")
-
-                        gold_price_usd = float(gold_price)
-
-                        usd_cny_rate_raw = usd_cny_data.loc[date, 'Close']
-                        # 只打印一次详细信息，避免刷屏
-                        if len(historical_data) < 2:
-                            debug_expander.info(
-                                f"日期 {date.strftime('%Y-%m-%d')} 的汇率原始值: {usd_cny_rate_raw}, 类型: {type(usd_cny_rate_raw)}")
-
-                        usd_cny_rate = float(usd_cny_rate_raw)
-                        gold_price_cny = gold_price_usd * usd_cny_rate
-
-                        historical_data.append({
-                            "date": date.strftime('%Y-%m-%d'),
-                            "international_price_usd": gold_price_usd,
-                            "international_price_cny": gold_price_cny,
-                            "china_price_cny": gold_price_cny * 1.03,  # 假设3%溢价
-                            "usd_cny_rate": usd_cny_rate,
-                            "premium_rate": 1.03
-                        })
-                    except Exception as e:
-                        error_msg = f"处理 {date.strftime('%Y-%m-%d')} 的数据时出错: {str(e)}"
-                        debug_expander.warning(error_msg)
-                        problem_dates.append(
-                            {"date": date.strftime('%Y-%m-%d'), "error": str(e)})
-                        continue
-                else:
-                    debug_expander.warning(
-                        f"日期 {date.strftime('%Y-%m-%d')} 在汇率数据中不存在")
-            except Exception as e:
-                debug_expander.error(f"处理日期 {date} 时发生意外错误: {str(e)}")
-                continue
 
-        # 显示所有问题日期的汇总
-        if problem_dates:
-            debug_expander.warning(f"共有 {len(problem_dates)} 个日期处理出错")
-            problem_df = pd.DataFrame(problem_dates)
-            debug_expander.dataframe(problem_df)
+def read_history_from_db(start_date, end_date):
+    """从数据库读取 [start_date, end_date) 区间的历史数据，按日期升序"""
+    last_date = (pd.Timestamp(end_date) - timedelta(days=1)).strftime('%Y-%m-%d')
+    df = get_gold_prices(start_date, last_date)
+    if df.empty:
+        return pd.DataFrame()
+    return df.sort_values(by='date')[HISTORY_COLUMNS].reset_index(drop=True)
 
-        df = pd.DataFrame(historical_data)
 
-        # 调试信息
-        debug_expander.info(f"处理后的历史数据: {len(df)}条记录")
-        if not df.empty:
-            debug_expander.info(
-                f"历史数据日期范围: {df['date'].min()} 到 {df['date'].max()}")
+def history_store():
+    """返回历史数据的列式存储；首次使用时从数据库回填已同步的数据"""
+    store = get_store()
+    if store.rows() == 0:
+        coverage = get_history_coverage()
+        if coverage is not None:
+            store.append(read_history_from_db(*coverage))
+    return store
+
+
+def read_history(start_date, end_date):
+    """从列式存储切片读取 [start_date, end_date) 区间的历史数据，按日期升序"""
+    store = history_store()
+    df = store.to_frame(start_date, end_date)
+    if df.empty:
+        return pd.DataFrame()
+    # 以存储版本和读取区间作为数据版本，下游分析缓存不必对整表做哈希
+    return stamp(df[HISTORY_COLUMNS], (start_date, end_date, store.version()))
+
+
+def local_data_only():
+    """数据是否由后台采集写入数据库，页面只读取本地数据"""
+    return INGEST_MODE in ('background', 'external')
+
+
+@st.cache_data(ttl=60)  # 后台采集会持续更新数据库，只短暂缓存
+def get_local_quote():
+    """从数据库读取最新行情，返回 (国际金价, 汇率, 日期)，没有数据返回 (None, None, None)"""
+    latest_data = get_latest_gold_price()
+    if latest_data.empty:
+        return None, None, None
+    row = latest_data.iloc[0]
+    return float(row['international_price_usd']), float(row['usd_cny_rate']), row['date']
+
+
+@st.cache_data(ttl=60, max_entries=ANALYTICS_CACHE_ENTRIES)  # 后台采集会持续更新数据库，只短暂缓存
+def get_local_history(days):
+    """从数据库读取后台同步的最近 days 天历史数据"""
+    return read_history(*history_window(days))
+
+
+# 历史数据滑块的最大天数；任意较短窗口都是它的后缀，从同一份数据中切片
+HISTORY_MAX_DAYS = 365
+_history_ranges = RangeCache('history_ranges', max_bytes=HISTORY_CACHE_BYTES)
+
+
+def get_historical_gold_data(days):
+    """获取最近 days 天的历史黄金价格数据
+
+    首次请求时加载最近 HISTORY_MAX_DAYS 天的完整窗口，之后滑块选择的任意较短窗口
+    都在内存中切片，不再单独下载或缓存。
+    """
+    start_str, end_str = history_window(days)
+    superset_start, _ = history_window(max(days, HISTORY_MAX_DAYS))
+    return _history_ranges.get(start_str, end_str, load_history_range, superset_start)
+
+
+@tiered_cache(ttl=24*3600, max_entries=4, max_bytes=HISTORY_CACHE_BYTES,
+              validate=lambda df: not df.empty)  # 内存+磁盘缓存24小时
+def load_history_range(start_str, end_str):
+    """获取 [start_str, end_str) 的历史黄金价格数据（增量同步到本地数据库）"""
+    try:
+        # 创建调试信息的expander，默认收起
+        debug_expander = st.expander("调试信息（点击展开）", expanded=False)
+
+        debug_expander.info(f"获取从 {start_str} 到 {end_str} 的历史数据")
+
+        synced = sync_history(start_str, end_str, debug_expander)
+        df = read_history(start_str, end_str)
 
         if df.empty:
+            if not synced:
+                st.error("无法获取完整的历史数据")
             st.warning("在指定时间范围内没有找到有效数据")
             return pd.DataFrame()
 
-        # 最后排序确保数据按日期顺序
-        df = df.sort_values(by='date')
+        if not synced:
+            st.warning("部分历史数据同步失败，当前显示本地已有数据")
+
+        # 调试信息
+        debug_expander.info(f"处理后的历史数据: {len(df)}条记录")
+        debug_expander.info(
+            f"历史数据日期范围: {df['date'].min()} 到 {df['date'].max()}")
+
         return df
 
     except Exception as e:
@@ -357,7 +609,47 @@ def get_historical_gold_data(days):
         return pd.DataFrame()
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
+# 日线增量指标状态在数据库中的名称；与分析视图一样基于国际金价(美元)
+INDICATOR_STATE = 'gold_daily_usd'
+INDICATOR_COLUMN = 'international_price_usd'
+
+
+def advance_indicator_state(days=HISTORY_MAX_DAYS, name=INDICATOR_STATE, save=True):
+    """读取增量指标检查点，用之后新增的日线数据推进，返回 (最新指标值, 最后日期)
+
+    已有检查点时只读取检查点之后的新数据，每条数据 O(1) 更新；
+    首次运行时用最近 days 天的数据预热。save=False 时只读不写检查点。
+    """
+    state = load_indicator_state(name)
+    streaming = StreamingIndicators.from_dict(state) if state else None
+    if streaming is None or not streaming.matches():
+        streaming = StreamingIndicators()
+
+    start_date, end_date = history_window(days)
+    if streaming.last_key is not None:
+        start_date = (pd.Timestamp(streaming.last_key) + timedelta(days=1)).strftime('%Y-%m-%d')
+    history = read_history(start_date, end_date) if start_date < end_date else pd.DataFrame()
+    if history.empty:
+        return streaming.values(), streaming.last_key
+
+    for date, price in zip(history['date'], history[INDICATOR_COLUMN]):
+        values = streaming.update(price, date)
+    if save:
+        save_indicator_state(name, streaming.to_dict())
+    return values, streaming.last_key
+
+
+# 新的日线数据写入后随检查点更新，只短暂缓存；历史数据尚未同步（没有指标）时不缓存
+@tiered_cache(ttl=60, max_entries=1, validate=lambda result: result[1] is not None)
+def get_latest_indicators():
+    """最新的均线、波动率和 RSI，来自增量指标检查点，不重新计算整段历史
+
+    后台采集模式下由采集进程推进检查点，页面只读取；否则由页面推进并保存。
+    """
+    return advance_indicator_state(save=not local_data_only())
+
+
+@st.cache_data(ttl=24*3600, max_entries=64)  # 缓存24小时
 def get_china_gold_price(international_price_usd, usd_cny_rate):
     """获取中国黄金价格（模拟）"""
     try:
@@ -371,9 +663,10 @@ def get_china_gold_price(international_price_usd, usd_cny_rate):
         return None, None
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
-def create_gold_price_chart(history_data):
-    """创建黄金价格走势图"""
+@st.cache_data(ttl=24*3600, max_entries=FIGURE_CACHE_ENTRIES)  # 缓存24小时
+def create_gold_price_chart(_history_data, version):
+    """创建黄金价格走势图（version 为数据版本标识，作为缓存键）"""
+    history_data = _history_data
     fig = go.Figure()
     fig.add_trace(go.Scatter(
         x=history_data['date'],
@@ -397,37 +690,42 @@ def create_gold_price_chart(history_data):
     return fig
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
-def calculate_moving_averages(df, column='international_price_usd'):
-    """计算移动平均线"""
-    result = df.copy()
-    result['MA5'] = result[column].rolling(window=5).mean()
-    result['MA10'] = result[column].rolling(window=10).mean()
-    result['MA20'] = result[column].rolling(window=20).mean()
-    result['MA60'] = result[column].rolling(window=60).mean()
+@st.cache_data(ttl=24*3600, max_entries=ANALYTICS_CACHE_ENTRIES)  # 缓存24小时
+def calculate_indicators(_df, version, column='international_price_usd', vol_window=20,
+                         rsi_period=14, extras=DEFAULT_EXTRAS):
+    """一次计算均线、收益率、波动率、RSI 等全部技术指标，附加到数据副本上
+
+    以下分析函数的 version 均为数据版本标识（见 data_version.frame_version），
+    作为缓存键代替对整个 DataFrame 的哈希。
+    """
+    result = _df.copy()
+    indicators = compute_indicators(result[column].to_numpy(dtype=float),
+                                    vol_window=vol_window, rsi_period=rsi_period,
+                                    extras=extras)
+    for name, values in indicators.items():
+        result[name] = values
     return result
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
-def calculate_volatility(df, column='international_price_usd', window=20):
-    """计算价格波动率"""
-    result = df.copy()
-    # 计算每日收益率
-    result['daily_return'] = result[column].pct_change()
-    # 计算滚动波动率 (标准差)
-    result['volatility'] = result['daily_return'].rolling(
-        window=window).std() * np.sqrt(window)
-    return result
+# 波动率窗口和 RSI 周期滑块的取值范围（含两端），全部取值预先计算
+VOL_WINDOWS = range(5, 31)
+RSI_PERIODS = range(7, 22)
+
 
+@st.cache_data(ttl=24*3600, max_entries=ANALYTICS_CACHE_ENTRIES)  # 缓存24小时
+def calculate_indicator_grids(_df, version, column='international_price_usd'):
+    """一次计算所有滑块取值下的波动率和 RSI，返回 {指标名: 二维数组}"""
+    return indicator_grids(_df[column].to_numpy(dtype=float), VOL_WINDOWS, RSI_PERIODS)
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
-def perform_seasonal_analysis(df, column='international_price_usd'):
+
+@st.cache_data(ttl=24*3600, max_entries=ANALYTICS_CACHE_ENTRIES)  # 缓存24小时
+def perform_seasonal_analysis(_df, version, column='international_price_usd'):
     """进行季节性分析"""
-    if len(df) < 30:  # 至少需要30个数据点
+    if len(_df) < 30:  # 至少需要30个数据点
         return None
 
     # 确保日期是索引且按顺序排列
-    df = df.sort_values('date')
+    df = _df.sort_values('date')
     df['date'] = pd.to_datetime(df['date'])
     df = df.set_index('date')
 
@@ -440,33 +738,10 @@ def perform_seasonal_analysis(df, column='international_price_usd'):
         return None
 
 
-@st.cache_data(ttl=24*3600)  # 缓存24小时
-def calculate_rsi(df, column='international_price_usd', periods=14):
-    """计算相对强弱指标 (RSI)"""
-    result = df.copy()
-    # 计算每日价格变化
-    delta = result[column].diff()
-
-    # 分离上升和下降的价格变动
-    gain = delta.clip(lower=0)
-    loss = -delta.clip(upper=0)
-
-    # 计算平均上升和下降
-    avg_gain = gain.rolling(window=periods).mean()
-    avg_loss = loss.rolling(window=periods).mean()
-
-    # 计算相对强度
-    rs = avg_gain / avg_loss
-
-    # 计算RSI
-    result['RSI'] = 100 - (100 / (1 + rs))
-
-    return result
-
-
-@st.cache_data(ttl=24*3600)  # 缓存24小时
-def calculate_correlation_matrix(history_data, external_data=None):
+@st.cache_data(ttl=24*3600, max_entries=ANALYTICS_CACHE_ENTRIES)  # 缓存24小时
+def calculate_correlation_matrix(_history_data, version, external_data=None):
     """计算黄金与其他资产的相关性"""
+    history_data = _history_data
     if external_data is None:
         # 如果没有提供外部数据，只分析内部数据
         corr_columns = ['international_price_usd', 'international_price_cny',
@@ -756,203 +1031,408 @@ def draw_premium_rate_chart(history_data):
     return fig
 
 
+def downsample_for_chart(df, y_cols, max_points=None):
+    """按图表宽度对绘图数据降采样（LTTB），返回 (绘图数据, 省略的点数)"""
+    return downsample_frame(df, 'date', y_cols, max_points or max_points_for_width())
+
+
+def show_downsample_note(total, dropped):
+    """提示图表因降采样省略的数据点数"""
+    if dropped:
+        st.caption(f"图表已按宽度降采样：显示 {total - dropped:,} / {total:,} 个数据点（省略 {dropped:,} 个）")
+
+
+# 手动刷新时重新同步的最近天数（近期数据可能被数据源修正或尚不完整）
+REFRESH_TAIL_DAYS = 7
+
+
+def invalidate_history_tail(days=REFRESH_TAIL_DAYS):
+    """将历史数据同步记录的结束日期回退 days 天，下次同步时重新下载这段数据"""
+    coverage = get_history_coverage()
+    if coverage is None:
+        return
+    start_date, end_date = coverage
+    tail_start = (pd.Timestamp(end_date) - timedelta(days=days)).strftime('%Y-%m-%d')
+    update_history_coverage(start_date, max(start_date, tail_start))
+
+
+def refresh_latest():
+    """手动刷新：只失效最新行情和历史数据末尾
+
+    历史数据的分析缓存以数据版本（存储版本 + 日期区间）为键，
+    末尾重新同步后版本随之改变，页面自然使用新结果；
+    未变化区间的分析结果和其他页面（如销售数据）的缓存保持不变，
+    避免一次刷新让所有用户的缓存同时失效。
+    """
+    with _latest_quotes_lock:
+        _latest_quotes['time'] = 0.0
+    get_gold_data.clear()
+    get_usd_cny_rate.clear()
+    get_local_quote.clear()
+
+    invalidate_history_tail()
+    # 各窗口都以今天为结束日期，末尾变化后需要重新加载
+    load_history_range.clear()
+    _history_ranges.clear()
+    get_local_history.clear()
+    get_latest_indicators.clear()
+
+
 def clear_cache():
-    """清除所有缓存的数据"""
+    """清除黄金价格分析的所有缓存"""
     get_gold_data.clear()
     get_usd_cny_rate.clear()
-    get_historical_gold_data.clear()
+    load_history_range.clear()
+    _history_ranges.clear()
     get_china_gold_price.clear()
     create_gold_price_chart.clear()
-    calculate_moving_averages.clear()
-    calculate_volatility.clear()
+    calculate_indicators.clear()
+    calculate_indicator_grids.clear()
     perform_seasonal_analysis.clear()
-    calculate_rsi.clear()
     calculate_correlation_matrix.clear()
-    # 移除没有使用@st.cache_data装饰器的函数的clear调用
-    st.cache_data.clear()
+    get_local_quote.clear()
+    get_local_history.clear()
+    get_latest_indicators.clear()
 
 
-def show_gold_analysis():
-    """显示黄金价格分析"""
-    st.title("黄金价格分析")
+# 各分析视图中滑块的 session_state 键和默认值
+VIEW_STATE_DEFAULTS = {'gold_vol_window': 20, 'gold_rsi_period': 14}
 
-    # 添加刷新按钮
-    col1, col2 = st.columns([3, 1])
+
+def keep_view_state():
+    """保留未显示视图中的滑块取值
+
+    控件在某次运行中没有渲染时 Streamlit 会丢弃它的状态；每次运行都重新赋值一次，
+    切换回该视图时滑块仍是之前的取值。
+    """
+    for key, default in VIEW_STATE_DEFAULTS.items():
+        st.session_state[key] = st.session_state.get(key, default)
+
+
+def indicator_slider(label, key, values):
+    """取值保存在 session_state[key] 中的参数滑块"""
+    return st.slider(label, values[0], values[-1], key=key)
+
+
+def render_price_view(history_data, version):
+    """基础价格图表"""
+    st.subheader("基础价格图表")
+    chart_data, dropped = downsample_for_chart(
+        history_data, ['china_price_cny', 'international_price_cny'])
+    fig = create_gold_price_chart(chart_data, frame_version(chart_data))
+    st.plotly_chart(fig, use_container_width=True)
+    show_downsample_note(len(history_data), dropped)
+
+    # 溢价率图表
+    st.subheader("国内外价格溢价分析")
+    premium_fig = draw_premium_rate_chart(history_data)
+    st.plotly_chart(premium_fig, use_container_width=True)
+
+
+def render_trend_view(history_data, version):
+    """趋势分析"""
+    st.subheader("价格趋势分析")
+    ma_data = calculate_indicators(history_data, version, vol_window=None, rsi_period=None)
+    chart_data, dropped = downsample_for_chart(
+        ma_data, ['international_price_usd', 'MA5', 'MA10', 'MA20', 'MA60'])
+    trend_fig = draw_trend_analysis_chart(chart_data)
+    st.plotly_chart(trend_fig, use_container_width=True)
+    show_downsample_note(len(ma_data), dropped)
+
+    # 显示移动平均线数据
+    with st.expander("查看移动平均线数据"):
+        st.dataframe(
+            ma_data[['date', 'international_price_usd', 'MA5', 'MA10', 'MA20', 'MA60']])
+
+
+def render_volatility_view(history_data, version):
+    """波动性分析"""
+    st.subheader("价格波动性分析")
+    vol_window = indicator_slider("波动率计算窗口(天)", 'gold_vol_window', VOL_WINDOWS)
+
+    # 波动率从预计算的二维结果中按行取值，拖动滑块不会触发重新计算
+    grids = calculate_indicator_grids(history_data, version)
+    vol_data = history_data.assign(volatility=grids['volatility'][VOL_WINDOWS.index(vol_window)])
+
+    # 检查波动率数据是否为空
+    if vol_data['volatility'].dropna().empty:
+        st.warning(f"无法计算波动率，可能是因为数据点不足或全为空值。需要至少{vol_window+1}天的数据。")
+        st.info("请尝试减小波动率计算窗口或增加历史数据查询天数。")
+        return
+
+    chart_data, dropped = downsample_for_chart(
+        vol_data, ['international_price_usd', 'volatility'])
+    vol_fig = draw_volatility_chart(chart_data)
+    st.plotly_chart(vol_fig, use_container_width=True)
+    show_downsample_note(len(vol_data), dropped)
+
+    # 分析波动率数据
+    recent_vol = vol_data['volatility'].dropna().iloc[-1] * 100
+    avg_vol = vol_data['volatility'].dropna().mean() * 100
+
+    col1, col2 = st.columns(2)
     with col1:
-        st.write("实时黄金价格数据")
+        st.metric("当前波动率(%)", f"{recent_vol:.2f}%",
+                  delta=f"{recent_vol - avg_vol:.2f}%",
+                  delta_color="inverse")
     with col2:
-        if st.button("🔄 手动刷新", help="清除缓存并从Yahoo Finance重新获取数据"):
-            clear_cache()
-            st.success("正在刷新数据...")
-            st.rerun()
+        st.metric("平均波动率(%)", f"{avg_vol:.2f}%")
 
-    # 获取数据
-    international_price_usd, gold_data = get_gold_data()
-    usd_cny_rate = get_usd_cny_rate()
 
-    if international_price_usd is None:
-        st.error("无法获取黄金价格数据，请稍后再试。")
-        st.info("建议：\n1. 检查网络连接\n2. 等待几分钟后刷新页面\n3. 如果问题持续存在，请联系技术支持")
+def render_technical_view(history_data, version):
+    """技术指标"""
+    st.subheader("技术指标分析")
+    rsi_period = indicator_slider("RSI计算周期(天)", 'gold_rsi_period', RSI_PERIODS)
+
+    # RSI 同样从预计算结果中按行取值
+    grids = calculate_indicator_grids(history_data, version)
+    tech_data = history_data.assign(RSI=grids['RSI'][RSI_PERIODS.index(rsi_period)])
+
+    # 检查RSI数据是否为空
+    if tech_data['RSI'].dropna().empty:
+        st.warning(f"无法计算RSI，可能是因为数据点不足。需要至少{rsi_period+1}天的数据。")
+        st.info("请尝试减小RSI计算周期或增加历史数据查询天数。")
         return
 
-    # 计算人民币价格
-    international_price_cny = international_price_usd * usd_cny_rate
-    china_price_cny, premium_rate = get_china_gold_price(
-        international_price_usd, usd_cny_rate)
+    chart_data, dropped = downsample_for_chart(
+        tech_data, ['international_price_usd', 'RSI'])
+    tech_fig = draw_technical_indicators(chart_data)
+    st.plotly_chart(tech_fig, use_container_width=True)
+    show_downsample_note(len(tech_data), dropped)
+
+    # RSI分析
+    current_rsi = tech_data['RSI'].dropna().iloc[-1]
+
+    if current_rsi > 70:
+        rsi_conclusion = "RSI值高于70，可能处于超买状态，价格可能会回调"
+        rsi_color = "red"
+    elif current_rsi < 30:
+        rsi_conclusion = "RSI值低于30，可能处于超卖状态，价格可能会反弹"
+        rsi_color = "green"
+    else:
+        rsi_conclusion = "RSI值在30-70之间，处于中性区间"
+        rsi_color = "gray"
 
-    # 保存数据到数据库
-    current_date = datetime.now().strftime('%Y-%m-%d')
-    save_gold_price(
-        date=current_date,
-        international_price_usd=international_price_usd,
-        international_price_cny=international_price_cny,
-        china_price_cny=china_price_cny,
-        usd_cny_rate=usd_cny_rate,
-        premium_rate=premium_rate
-    )
+    st.markdown(
+        f"<p style='color:{rsi_color}'><b>RSI分析:</b> {rsi_conclusion}</p>", unsafe_allow_html=True)
 
-    # 显示当前价格
-    price_col1, price_col2 = st.columns(2)
-    with price_col1:
-        st.metric("国际金价(美元/盎司)", f"${international_price_usd:.2f}")
-        st.metric("国际金价(人民币/盎司)", f"¥{international_price_cny:.2f}")
-    with price_col2:
-        st.metric("国内金价(人民币/克)", f"¥{china_price_cny/31.1035:.2f}")
-        st.metric("美元兑人民币汇率", f"{usd_cny_rate:.4f}")
+
+def render_seasonal_view(history_data, version):
+    """季节性分析"""
+    st.subheader("季节性分析")
+
+    if len(history_data) < 30:
+        st.warning("季节性分析至少需要30天的数据。请增加历史数据范围。")
+        return
+
+    seasonal_result = perform_seasonal_analysis(history_data, version)
+    if seasonal_result is None:
+        st.warning("无法执行季节性分析，可能是数据点不足或数据格式不适合")
+        return
+
+    seasonal_fig = draw_seasonal_chart(seasonal_result, history_data)
+    st.plotly_chart(seasonal_fig, use_container_width=True)
+
+    # 提取季节性分量的洞察
+    seasonal_component = seasonal_result.seasonal
+    max_seasonal_effect = seasonal_component.max()
+    min_seasonal_effect = seasonal_component.min()
+
+    st.markdown(f"""
+    **季节性分析洞察:**
+    - 季节性影响范围: ${min_seasonal_effect:.2f} 到 ${max_seasonal_effect:.2f}
+    - 季节性因素可能会使价格在周期内波动约 ${abs(max_seasonal_effect - min_seasonal_effect):.2f} 美元
+    """)
+
+
+def render_correlation_view(history_data, version):
+    """相关性分析"""
+    st.subheader("相关性分析")
+
+    corr_matrix = calculate_correlation_matrix(history_data, version)
+    corr_fig = draw_correlation_heatmap(corr_matrix)
+    st.plotly_chart(corr_fig, use_container_width=True)
+
+    # 相关性解释
+    st.markdown("""
+    **相关性解释:**
+    - 1.0表示完全正相关，-1.0表示完全负相关，0表示无相关性
+    - 国际金价(美元)与国际金价(人民币)高度相关，但受汇率影响
+    - 国内金价与国际金价存在很强的相关性，但溢价率变化会影响相关性强度
+    """)
+
+
+# 分析视图名称 -> 渲染函数（参数为历史数据和数据版本）
+ANALYSIS_VIEWS = {
+    "基础价格图表": render_price_view,
+    "趋势分析": render_trend_view,
+    "波动性分析": render_volatility_view,
+    "技术指标": render_technical_view,
+    "季节性分析": render_seasonal_view,
+    "相关性分析": render_correlation_view,
+}
+
+
+# 页面各部分最近的渲染耗时，按会话记录
+LATENCY_HISTORY = 20
+_last_saved_quote = {}
+_pending_quote = {}  # 已提交、尚未写入完成的行情
+_last_saved_quote_lock = threading.Lock()
+
+
+def fetch_latest_prices(symbols):
+    """经过限流器批量获取多个代码的盘中最新价格，返回 {代码: 价格}，失败返回空字典"""
+    provider = get_provider()
+    batch_key = 'latest:' + ','.join(symbols)
+    if provider.rate_limited and not rate_limiter.acquire(batch_key):
+        return {}
+
+    try:
+        prices = provider.latest_prices(symbols, timeout=10)
+    except Exception:
+        if provider.rate_limited:
+            rate_limiter.record_failure(batch_key)
+        return {}
+
+    if provider.rate_limited:
+        rate_limiter.record_success(batch_key)
+    return prices
+
+
+def fetch_intraday_quote():
+    """从数据源获取盘中最新的 (国际金价, 汇率)，失败返回 None
+
+    先请求主要黄金数据源和汇率，主要数据源都没有报价时再请求备用ETF。
+    """
+    symbols = [symbol for symbol, _ in PRIMARY_GOLD_SYMBOLS] + EXCHANGE_SYMBOLS
+    prices = fetch_latest_prices(symbols)
+
+    rate = next((_rate_from_price(symbol, prices[symbol])
+                 for symbol in EXCHANGE_SYMBOLS if prices.get(symbol)), None)
+    if rate is None:
+        return None
+
+    price = _gold_price_from_prices(prices, PRIMARY_GOLD_SYMBOLS)
+    if price is None:
+        backup = fetch_latest_prices([symbol for symbol, _ in BACKUP_GOLD_SYMBOLS])
+        price = _gold_price_from_prices(backup, BACKUP_GOLD_SYMBOLS)
+    if price is None:
+        return None
+    return price, rate
+
+
+def _gold_price_from_prices(prices, candidates):
+    """按优先级从 {代码: 价格} 中选出每盎司黄金价格，没有报价返回 None"""
+    for symbol, multiplier in candidates:
+        if prices.get(symbol):
+            return prices[symbol] * multiplier
+    return None
+
+
+def fetch_live_quote():
+    """实时面板的一次行情采样，返回 (国际金价, 汇率)，失败返回 None
+
+    后台采集模式下读取采集进程写入数据库的最新行情，该行只在每次采集时更新，
+    因此附带写入时间作为版本，写入时间和价格都没有变化时采样线程不重复记录；
+    否则请求数据源的盘中行情（分钟线或实时报价）。
+    """
+    if local_data_only():
+        latest_data = get_latest_gold_price()
+        if latest_data.empty:
+            return None
+        row = latest_data.iloc[0]
+        return float(row['international_price_usd']), float(row['usd_cny_rate']), row['created_at']
+
+    return fetch_intraday_quote()
+
+
+@st.cache_resource
+def get_live_ticker():
+    """所有会话共享的实时行情采样线程（每个进程只启动一次）"""
+    ticker = LiveTicker(fetch_live_quote)
+    ticker.start()
+    return ticker
+
+
+def save_quote_if_changed(**record):
+    """行情与上次保存的相同时跳过写入，页面每次重新运行不再都写一次数据库
+
+    写入成功后才记为已保存；后台写入最终失败时，下次页面运行会重新提交。
+    """
+    with _last_saved_quote_lock:
+        if record in (_last_saved_quote, _pending_quote):
+            return False
+        _pending_quote.clear()
+        _pending_quote.update(record)
+
+    def on_saved(success):
+        with _last_saved_quote_lock:
+            if success:
+                _last_saved_quote.clear()
+                _last_saved_quote.update(record)
+            if _pending_quote == record:
+                _pending_quote.clear()
+
+    save_gold_price(**record, on_saved=on_saved)
+    return True
+
+
+def show_latency(scope, seconds):
+    """显示并记录本次渲染耗时（毫秒）"""
+    history = st.session_state.setdefault('gold_latency', [])
+    history.append({'时间': datetime.now().strftime('%H:%M:%S'), '范围': scope,
+                    '耗时(ms)': round(seconds * 1000, 1)})
+    del history[:-LATENCY_HISTORY]
+    st.caption(f"{scope}渲染耗时 {seconds * 1000:.1f} ms")
+
+
+def show_latest_indicators():
+    """显示增量指标检查点中的最新技术指标"""
+    indicators, last_date = get_latest_indicators()
+    if last_date is None:
+        return
+
+    def display(name, template):
+        value = indicators[name]
+        return "-" if pd.isna(value) else template.format(value)  # 数据不足一个窗口
+
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("MA20(美元/盎司)", display('MA20', "${:.2f}"))
+    with col2:
+        st.metric("MA60(美元/盎司)", display('MA60', "${:.2f}"))
+    with col3:
+        st.metric("20日波动率", display('volatility', "{:.2%}"))
+    with col4:
+        st.metric("RSI(14)", display('RSI', "{:.1f}"))
+    st.caption(f"技术指标截至 {last_date}（增量更新）")
+
+
+@st.fragment
+def show_history_panel():
+    """历史数据、分析视图和统计（独立重新运行的片段）
+
+    拖动天数或分析参数滑块、切换分析视图时只重新运行该片段，
+    不会重新获取行情、写入数据库或渲染页面的其他部分。
+    """
+    panel_start = time.perf_counter()
 
     # 获取历史数据
     st.subheader("历史数据")
-    history_days = st.slider("显示最近多少天的数据", 7, 365, 30)
-    history_data = get_historical_gold_data(history_days)
+    history_days = st.slider("显示最近多少天的数据", 7, HISTORY_MAX_DAYS, 30)
+    if local_data_only():
+        read_start = time.perf_counter()
+        history_data = get_local_history(history_days)
+        st.caption(f"本地数据读取耗时 {(time.perf_counter() - read_start) * 1000:.1f} ms")
+    else:
+        history_data = get_historical_gold_data(history_days)
 
     if not history_data.empty:
-        # 使用标签页展示不同的图表
-        tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-            "基础价格图表", "趋势分析", "波动性分析", "技术指标", "季节性分析", "相关性分析"
-        ])
-
-        with tab1:
-            # 基础价格图表
-            st.subheader("基础价格图表")
-            fig = create_gold_price_chart(history_data)
-            st.plotly_chart(fig, use_container_width=True)
-
-            # 溢价率图表
-            st.subheader("国内外价格溢价分析")
-            premium_fig = draw_premium_rate_chart(history_data)
-            st.plotly_chart(premium_fig, use_container_width=True)
-
-        with tab2:
-            # 趋势分析
-            st.subheader("价格趋势分析")
-            ma_data = calculate_moving_averages(history_data)
-            trend_fig = draw_trend_analysis_chart(ma_data)
-            st.plotly_chart(trend_fig, use_container_width=True)
-
-            # 显示移动平均线数据
-            with st.expander("查看移动平均线数据"):
-                st.dataframe(
-                    ma_data[['date', 'international_price_usd', 'MA5', 'MA10', 'MA20', 'MA60']])
-
-        with tab3:
-            # 波动性分析
-            st.subheader("价格波动性分析")
-
-            vol_window = st.slider("波动率计算窗口(天)", 5, 30, 20)
-            vol_data = calculate_volatility(history_data, window=vol_window)
-
-            # 检查波动率数据是否为空
-            if vol_data['volatility'].dropna().empty:
-                st.warning(f"无法计算波动率，可能是因为数据点不足或全为空值。需要至少{vol_window+1}天的数据。")
-                st.info("请尝试减小波动率计算窗口或增加历史数据查询天数。")
-            else:
-                vol_fig = draw_volatility_chart(vol_data)
-                st.plotly_chart(vol_fig, use_container_width=True)
-
-                # 分析波动率数据
-                recent_vol = vol_data['volatility'].dropna().iloc[-1] * 100
-                avg_vol = vol_data['volatility'].dropna().mean() * 100
-
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("当前波动率(%)", f"{recent_vol:.2f}%",
-                              delta=f"{recent_vol - avg_vol:.2f}%",
-                              delta_color="inverse")
-                with col2:
-                    st.metric("平均波动率(%)", f"{avg_vol:.2f}%")
-
-        with tab4:
-            # 技术指标分析
-            st.subheader("技术指标分析")
-
-            rsi_period = st.slider("RSI计算周期(天)", 7, 21, 14)
-            tech_data = calculate_rsi(history_data, periods=rsi_period)
-
-            # 检查RSI数据是否为空
-            if tech_data['RSI'].dropna().empty:
-                st.warning(f"无法计算RSI，可能是因为数据点不足。需要至少{rsi_period+1}天的数据。")
-                st.info("请尝试减小RSI计算周期或增加历史数据查询天数。")
-            else:
-                tech_fig = draw_technical_indicators(tech_data)
-                st.plotly_chart(tech_fig, use_container_width=True)
-
-                # RSI分析
-                current_rsi = tech_data['RSI'].dropna().iloc[-1]
-
-                if current_rsi > 70:
-                    rsi_conclusion = "RSI值高于70，可能处于超买状态，价格可能会回调"
-                    rsi_color = "red"
-                elif current_rsi < 30:
-                    rsi_conclusion = "RSI值低于30，可能处于超卖状态，价格可能会反弹"
-                    rsi_color = "green"
-                else:
-                    rsi_conclusion = "RSI值在30-70之间，处于中性区间"
-                    rsi_color = "gray"
-
-                st.markdown(
-                    f"<p style='color:{rsi_color}'><b>RSI分析:</b> {rsi_conclusion}</p>", unsafe_allow_html=True)
-
-        with tab5:
-            # 季节性分析
-            st.subheader("季节性分析")
-
-            if len(history_data) >= 30:
-                seasonal_result = perform_seasonal_analysis(history_data)
-                if seasonal_result is not None:
-                    seasonal_fig = draw_seasonal_chart(
-                        seasonal_result, history_data)
-                    st.plotly_chart(seasonal_fig, use_container_width=True)
-
-                    # 提取季节性分量的洞察
-                    seasonal_component = seasonal_result.seasonal
-                    max_seasonal_effect = seasonal_component.max()
-                    min_seasonal_effect = seasonal_component.min()
-
-                    st.markdown(f"""
-                    **季节性分析洞察:**
-                    - 季节性影响范围: ${min_seasonal_effect:.2f} 到 ${max_seasonal_effect:.2f}
-                    - 季节性因素可能会使价格在周期内波动约 ${abs(max_seasonal_effect - min_seasonal_effect):.2f} 美元
-                    """)
-                else:
-                    st.warning("无法执行季节性分析，可能是数据点不足或数据格式不适合")
-            else:
-                st.warning("季节性分析至少需要30天的数据。请增加历史数据范围。")
-
-        with tab6:
-            # 相关性分析
-            st.subheader("相关性分析")
-
-            corr_matrix = calculate_correlation_matrix(history_data)
-            corr_fig = draw_correlation_heatmap(corr_matrix)
-            st.plotly_chart(corr_fig, use_container_width=True)
-
-            # 相关性解释
-            st.markdown("""
-            **相关性解释:**
-            - 1.0表示完全正相关，-1.0表示完全负相关，0表示无相关性
-            - 国际金价(美元)与国际金价(人民币)高度相关，但受汇率影响
-            - 国内金价与国际金价存在很强的相关性，但溢价率变化会影响相关性强度
-            """)
+        # 只渲染选中的分析视图，其他视图的计算和图表构建不会执行
+        keep_view_state()
+        view = st.radio("分析视图", list(ANALYSIS_VIEWS), horizontal=True,
+                        key='gold_analysis_view', label_visibility="collapsed")
+        ANALYSIS_VIEWS[view](history_data, frame_version(history_data))
 
         # 显示数据表格
         with st.expander("查看原始数据表格"):
@@ -979,3 +1459,113 @@ def show_gold_analysis():
             """)
     else:
         st.info("暂无统计数据")
+
+    show_latency('历史数据面板', time.perf_counter() - panel_start)
+    with st.expander("交互耗时"):
+        st.dataframe(pd.DataFrame(st.session_state['gold_latency']), hide_index=True)
+
+
+def show_gold_analysis():
+    """显示黄金价格分析"""
+    page_start = time.perf_counter()
+    st.title("黄金价格分析")
+
+    # 添加刷新按钮
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.write("实时黄金价格数据")
+    with col2:
+        if st.button("🔄 手动刷新", help="重新获取最新行情和最近几天的历史数据"):
+            refresh_latest()
+            st.success("正在刷新数据...")
+            st.rerun()
+
+    # 获取数据
+    if local_data_only():
+        # 数据由后台采集写入，页面只读取本地数据库
+        international_price_usd, usd_cny_rate, quote_date = get_local_quote()
+
+        if international_price_usd is None:
+            st.info("后台采集尚未写入数据，请稍后刷新页面。")
+            return
+        if quote_date != datetime.now().strftime('%Y-%m-%d'):
+            st.warning(f"当前显示的是 {quote_date} 的行情，后台采集可能尚未更新")
+    else:
+        international_price_usd, gold_data = get_gold_data()
+        usd_cny_rate, _ = get_usd_cny_rate()
+
+    if international_price_usd is None:
+        st.error("无法获取黄金价格数据，请稍后再试。")
+        st.info("建议：\n1. 检查网络连接\n2. 等待几分钟后刷新页面\n3. 如果问题持续存在，请联系技术支持")
+        return
+
+    # 计算人民币价格
+    international_price_cny = international_price_usd * usd_cny_rate
+    china_price_cny, premium_rate = get_china_gold_price(
+        international_price_usd, usd_cny_rate)
+
+    # 保存数据到数据库（后台采集模式下由采集进程负责写入）
+    if not local_data_only():
+        save_quote_if_changed(
+            date=datetime.now().strftime('%Y-%m-%d'),
+            international_price_usd=international_price_usd,
+            international_price_cny=international_price_cny,
+            china_price_cny=china_price_cny,
+            usd_cny_rate=usd_cny_rate,
+            premium_rate=premium_rate
+        )
+
+    # 显示当前价格
+    price_col1, price_col2 = st.columns(2)
+    with price_col1:
+        st.metric("国际金价(美元/盎司)", f"${international_price_usd:.2f}")
+        st.metric("国际金价(人民币/盎司)", f"¥{international_price_cny:.2f}")
+    with price_col2:
+        st.metric("国内金价(人民币/克)", f"¥{china_price_cny/31.1035:.2f}")
+        st.metric("美元兑人民币汇率", f"{usd_cny_rate:.4f}")
+
+    show_latest_indicators()
+
+    # 实时行情：共享的采样线程写入环形缓冲区，面板按间隔只重新运行自身
+    if st.toggle("实时行情", key='gold_live_mode',
+                 help=f"每 {LIVE_INTERVAL} 秒更新实时价格，所有访问者共享同一份采样数据"):
+        show_live_panel(get_live_ticker())
+
+    # 历史数据和分析视图在独立的片段中渲染，调整其中的参数只重新运行该片段
+    show_history_panel()
+
+    # 显示数据源请求统计
+    with st.expander("数据源请求统计"):
+        limiter_stats = rate_limiter.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("请求次数", limiter_stats['requests'])
+        with col2:
+            st.metric("限流等待(秒)", f"{limiter_stats['throttle_wait_seconds']:.2f}")
+        with col3:
+            st.metric("退避等待(秒)", f"{limiter_stats['backoff_wait_seconds']:.2f}")
+        with col4:
+            st.metric("熔断拒绝次数", limiter_stats['rejected'])
+
+        if limiter_stats['open_circuits']:
+            st.warning(f"熔断中的数据源: {', '.join(limiter_stats['open_circuits'])}")
+
+        write_stats = write_queue.stats()
+        st.caption(f"数据库写入队列: 待写入 {write_stats['pending']} 条，已写入 {write_stats['written']} 条"
+                   f"（{write_stats['batches']} 批），重试 {write_stats['retries']} 次，"
+                   f"失败 {write_stats['failed']} 条")
+
+        range_stats = _history_ranges.stats()
+        st.caption(f"历史数据窗口缓存: 命中 {range_stats['hits']} 次，"
+                   f"未命中 {range_stats['misses']} 次，缓存区间 {range_stats['ranges']} 个")
+
+    # 显示缓存使用情况
+    with st.expander("缓存使用情况"):
+        report = cache_report()
+        if report.empty:
+            st.info("暂无缓存数据")
+        else:
+            st.dataframe(report, hide_index=True)
+            st.caption(f"合计约占用内存 {report['内存(KB)'].sum() / 1024:.2f} MB")
+
+    show_latency('整页', time.perf_counter() - page_start)
@@ -1,19 +1,35 @@
+import io
+import threading
+
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from datetime import datetime, timedelta
+from data_version import frame_version
+from downsample import lttb_indices, max_points_for_width
+
+# 缓存过滤后的数据和渲染好的图片，按钮切换时间范围时直接返回缓存的图片
 
-# 缓存过滤后的数据和图表生成，提高性能
+CHART_FIGSIZE = (10, 5)  # 英寸
+CHART_DPI = 100
 
+# 复用同一个 Figure 绘制所有图表：不经过 pyplot，不会在全局图表管理器中累积未关闭的图表；
+# Figure 不是线程安全的，多个会话同时渲染时用锁串行化
+_figure = None
+_figure_lock = threading.Lock()
 
-@st.cache_data
-def prepare_chart_data(gold_df, time_range):
+
+@st.cache_data(max_entries=16)
+def prepare_chart_data(_gold_df, version, time_range):
     """
     预处理并过滤数据，以提高性能
+    （version 为数据版本标识，作为缓存键代替对整个 DataFrame 的哈希）
     """
+    gold_df = _gold_df
     if gold_df is None or gold_df.empty:
-        return None, None, None, None
+        return None
 
     # 计算日期范围
     end_date = gold_df['Date'].max()
@@ -35,18 +51,14 @@ def prepare_chart_data(gold_df, time_range):
     filtered_df = gold_df[gold_df['Date'] >= start_date].copy()
 
     if filtered_df.empty:
-        return None, None, None, None
-
-    # 准备绘图数据
-    dates = filtered_df['Date'].tolist()
-    prices = []
+        return None
 
-    # 安全提取价格
-    for idx in range(len(filtered_df)):
-        price = filtered_df['Close'].iloc[idx]
-        if isinstance(price, pd.Series):
-            price = price.iloc[0]  # 使用 .iloc[0] 而不是 float()
-        prices.append(price)
+    # 准备绘图数据（yfinance 多级列索引时 Close 为 DataFrame，取第一列）
+    close = filtered_df['Close']
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    dates = pd.to_datetime(filtered_df['Date']).to_numpy()
+    prices = close.to_numpy(dtype=float)
 
     # 计算统计数据
     start_price = prices[0]
@@ -58,6 +70,66 @@ def prepare_chart_data(gold_df, time_range):
     return filtered_df, dates, prices, title, start_price, end_price, price_change_pct
 
 
+def get_figure():
+    """返回复用的 Figure（调用方需持有 _figure_lock），每次使用前清空"""
+    global _figure
+    if _figure is None:
+        _figure = Figure(figsize=CHART_FIGSIZE, dpi=CHART_DPI)
+        FigureCanvasAgg(_figure)
+    _figure.clf()
+    return _figure
+
+
+@st.cache_data(max_entries=16)
+def render_chart_image(_gold_df, version, time_range, image_format='png'):
+    """绘制金价走势图，返回 (图片字节, 降采样省略的点数)
+
+    以 (数据版本, 时间范围, 图片格式) 为缓存键，image_format 可为 'png' 或 'svg'。
+    """
+    result = prepare_chart_data(_gold_df, version, time_range)
+    if result is None:
+        return None, 0
+    _, dates, prices, title, _, _, _ = result
+
+    with _figure_lock:
+        fig = get_figure()
+        ax = fig.add_subplot()
+
+        # 按图表像素宽度降采样（LTTB），保留峰谷形状
+        width_px = fig.get_size_inches()[0] * fig.dpi
+        indices = lttb_indices(mdates.date2num(dates), prices,
+                               max_points_for_width(width_px))
+        dropped = len(prices) - len(indices)
+
+        # 绘制价格线
+        ax.plot(dates[indices], prices[indices], 'b-', linewidth=2)
+
+        # 设置图表样式 (保留英文标题避免字体问题)
+        ax.set_title(f'Gold Price - {title}', fontsize=14)
+        ax.set_xlabel('Date', fontsize=10)
+        ax.set_ylabel('Price (USD)', fontsize=10)
+        ax.grid(True, alpha=0.3)
+
+        # 根据时间范围格式化x轴
+        if time_range == "3M":
+            ax.xaxis.set_major_locator(mdates.WeekdayLocator(interval=2))
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b'))
+        elif time_range == "6M":
+            ax.xaxis.set_major_locator(mdates.MonthLocator())
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b'))
+        else:
+            ax.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
+
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=image_format)
+        fig.clf()  # 释放本次绘制的坐标轴和线条
+    return buffer.getvalue(), dropped
+
+
 def show_gold_chart(gold_df):
     """
     显示金价趋势图，带有简约的时间范围选择器
@@ -93,7 +165,8 @@ def show_gold_chart(gold_df):
         time_range = "3M"
 
     # 使用缓存函数处理数据
-    result = prepare_chart_data(gold_df, time_range)
+    version = frame_version(gold_df)
+    result = prepare_chart_data(gold_df, version, time_range)
 
     if result is None:
         st.warning("所选时间范围内没有可用数据")
@@ -103,33 +176,9 @@ def show_gold_chart(gold_df):
 
     # 创建图表
     try:
-        fig, ax = plt.subplots(figsize=(10, 5))  # 减小图表高度
-
-        # 绘制价格线
-        ax.plot(dates, prices, 'b-', linewidth=2)
-
-        # 设置图表样式 (保留英文标题避免字体问题)
-        ax.set_title(f'Gold Price - {title}', fontsize=14)
-        ax.set_xlabel('Date', fontsize=10)
-        ax.set_ylabel('Price (USD)', fontsize=10)
-        ax.grid(True, alpha=0.3)
-
-        # 根据时间范围格式化x轴
-        if time_range == "3M":
-            ax.xaxis.set_major_locator(mdates.WeekdayLocator(interval=2))
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%d %b'))
-        elif time_range == "6M":
-            ax.xaxis.set_major_locator(mdates.MonthLocator())
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b'))
-        else:
-            ax.xaxis.set_major_locator(mdates.MonthLocator(interval=2))
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
-
-        plt.xticks(rotation=45)
-        plt.tight_layout()
-
-        # 显示图表
-        st.pyplot(fig)
+        # 使用缓存的图片，相同数据版本和时间范围不会重新绘制
+        image, dropped = render_chart_image(gold_df, version, time_range)
+        st.image(image)
 
         # 显示价格统计数据（更紧凑的设计）
         col1, col2, col3 = st.columns([1, 1, 2])
@@ -152,8 +201,9 @@ def show_gold_chart(gold_df):
             if filtered_df is not None:
                 start_date = filtered_df['Date'].min().strftime('%Y-%m-%d')
                 end_date = filtered_df['Date'].max().strftime('%Y-%m-%d')
+                note = f"（图表省略 {dropped} 个）" if dropped else ""
                 st.info(
-                    f"显示从 {start_date} 到 {end_date} 的数据（共 {len(filtered_df)} 个数据点）")
+                    f"显示从 {start_date} 到 {end_date} 的数据（共 {len(filtered_df)} 个数据点{note}）")
 
     except Exception as e:
         st.error(f"生成图表时出错: {str(e)}")
@@ -0,0 +1,348 @@
+"""技术指标计算引擎
+
+对价格数组只做一次前缀和/差分，所有窗口的均线、收益率、滚动波动率、RSI
+以及可选的 EMA、MACD、布林带都由这些中间结果向量化得到，
+结果以 {指标名: float64 数组} 的形式返回，与 pandas 的 rolling 结果一致
+（窗口内有空值时结果为空值）。
+
+新行情到达时使用 StreamingIndicators 做 O(1) 增量更新，
+状态可以序列化后保存到数据库，重启后继续累加。
+"""
+import math
+from collections import deque
+
+import numpy as np
+from scipy.signal import lfilter
+
+DEFAULT_MA_WINDOWS = (5, 10, 20, 60)
+DEFAULT_EXTRAS = ()  # 可选: 'ema', 'macd', 'bollinger'
+
+EMA_SPANS = (12, 26)
+MACD_SPANS = (12, 26, 9)  # 快线、慢线、信号线
+BOLLINGER_WINDOW = 20
+BOLLINGER_WIDTH = 2
+
+
+class PrefixSums:
+    """一次计算前缀和，之后任意窗口的滚动和、滚动均值、滚动标准差都是 O(n) 的切片运算"""
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        valid = np.isfinite(values)
+        self.n = len(values)
+        # 常见情况下空值只出现在开头（如收益率、差分），此时无需逐窗口计数
+        self.lead = int(np.argmax(valid)) if valid.any() else self.n
+        self.contiguous = bool(valid[self.lead:].all())
+        # 减去均值再累加，降低大数值平方和相减时的精度损失
+        self.offset = values[valid].mean() if valid.any() else 0.0
+        self.centered = np.where(valid, values - self.offset, 0.0)
+        self.sum = np.concatenate(([0.0], np.cumsum(self.centered)))
+        self.count = None if self.contiguous else np.concatenate(([0], np.cumsum(valid)))
+        self._sumsq = None
+
+    def _window(self, prefix, window):
+        result = np.full(self.n, np.nan)
+        if window <= self.n:
+            result[window - 1:] = prefix[window:] - prefix[:-window]
+        return result
+
+    def _mask_incomplete(self, result, window):
+        """窗口内含有空值的位置置为空值"""
+        if self.contiguous:
+            result[:min(self.lead + window - 1, self.n)] = np.nan
+        else:
+            result[self._window(self.count, window) != window] = np.nan
+        return result
+
+    def window_sum(self, window):
+        return self._mask_incomplete(self._window(self.sum, window) + window * self.offset, window)
+
+    def mean(self, window):
+        return self._mask_incomplete(self._window(self.sum, window) / window + self.offset, window)
+
+    def std(self, window, ddof=1):
+        if self._sumsq is None:
+            self._sumsq = np.concatenate(([0.0], np.cumsum(self.centered * self.centered)))
+        s = self._window(self.sum, window)
+        sq = self._window(self._sumsq, window)
+        var = (sq - s * s / window) / (window - ddof)
+        return self._mask_incomplete(np.sqrt(np.maximum(var, 0.0)), window)
+
+    # ---- 多个窗口一次计算，结果为 (窗口数, n) 的二维数组 ----
+
+    def _grid(self, prefix, windows):
+        end = np.arange(1, self.n + 1)
+        start = end - windows[:, None]
+        return prefix[end] - prefix[np.maximum(start, 0)], start
+
+    def _mask_incomplete_grid(self, result, windows, start):
+        if self.contiguous:
+            positions = np.arange(self.n)
+            result[(start < 0) | (positions < self.lead + windows[:, None] - 1)] = np.nan
+        else:
+            counts, _ = self._grid(self.count, windows)
+            result[(start < 0) | (counts != windows[:, None])] = np.nan
+        return result
+
+    def window_sum_grid(self, windows):
+        windows = np.asarray(windows)
+        s, start = self._grid(self.sum, windows)
+        return self._mask_incomplete_grid(s + windows[:, None] * self.offset, windows, start)
+
+    def std_grid(self, windows, ddof=1):
+        windows = np.asarray(windows)
+        if self._sumsq is None:
+            self._sumsq = np.concatenate(([0.0], np.cumsum(self.centered * self.centered)))
+        s, start = self._grid(self.sum, windows)
+        sq, _ = self._grid(self._sumsq, windows)
+        var = (sq - s * s / windows[:, None]) / (windows[:, None] - ddof)
+        return self._mask_incomplete_grid(np.sqrt(np.maximum(var, 0.0)), windows, start)
+
+
+def ema(values, span):
+    """指数移动平均（与 pandas ewm(span, adjust=False) 一致）"""
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return values.copy()
+    alpha = 2 / (span + 1)
+    result, _ = lfilter([alpha], [1, alpha - 1], values, zi=[(1 - alpha) * values[0]])
+    return result
+
+
+def pct_change(values):
+    """逐期收益率，首个值为空值"""
+    values = np.asarray(values, dtype=float)
+    result = np.full(len(values), np.nan)
+    result[1:] = values[1:] / values[:-1] - 1
+    return result
+
+
+def positive_sum_grid(values, windows):
+    """各窗口内正值之和，结果为 (窗口数, n) 的二维数组
+
+    前缀和相减会留下舍入误差，窗口内没有正值时按计数精确置为0，
+    否则价格持平的窗口会得到任意的 RSI 而不是空值。
+    """
+    missing = np.isnan(values)
+    sums = PrefixSums(np.where(missing, np.nan, np.maximum(values, 0))).window_sum_grid(windows)
+    counts = PrefixSums(np.where(missing, np.nan, values > 0)).window_sum_grid(windows)
+    return np.where(counts < 0.5, 0.0, sums)  # 计数为空值时 sums 同样为空值
+
+
+def rsi_grid(deltas, periods):
+    """由价格差分计算多个周期的 RSI（简单移动平均版本，与 pandas rolling 的结果一致）
+
+    涨幅和跌幅分别用各自的前缀和求窗口和：全部上涨时为100，价格持平时为空值。
+    """
+    gain_sum = positive_sum_grid(deltas, periods)
+    loss_sum = positive_sum_grid(-deltas, periods)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + gain_sum / loss_sum)
+
+
+def rsi_from_deltas(deltas, period):
+    """由价格差分计算单个周期的 RSI"""
+    return rsi_grid(deltas, [period])[0]
+
+
+def indicator_grids(prices, vol_windows, rsi_periods):
+    """预先计算全部波动率窗口和 RSI 周期的结果
+
+    返回 {'volatility': 二维数组, 'RSI': 二维数组}，第 i 行对应 vol_windows[i] /
+    rsi_periods[i]，与 compute_indicators 在对应参数下的结果一致。
+    滑块改变参数时只需按行取值，不再重新计算。
+    """
+    prices = np.asarray(prices, dtype=float)
+    vol_windows = np.asarray(vol_windows)
+    rsi_periods = np.asarray(rsi_periods)
+
+    returns = PrefixSums(pct_change(prices))
+    volatility = returns.std_grid(vol_windows) * np.sqrt(vol_windows)[:, None]
+
+    deltas = np.full(len(prices), np.nan)
+    deltas[1:] = np.diff(prices)
+
+    return {'volatility': volatility, 'RSI': rsi_grid(deltas, rsi_periods)}
+
+
+def compute_indicators(prices, ma_windows=DEFAULT_MA_WINDOWS, vol_window=20,
+                       rsi_period=14, extras=DEFAULT_EXTRAS):
+    """一次计算全部技术指标，返回 {指标名: 数组}
+
+    包含 MA{窗口}、daily_return、volatility、RSI；
+    extras 可加入 'ema'（EMA12/EMA26）、'macd'（MACD/MACD_signal/MACD_hist）、
+    'bollinger'（BB_upper/BB_middle/BB_lower）。
+    vol_window 或 rsi_period 为 None 时跳过对应指标。
+    """
+    prices = np.asarray(prices, dtype=float)
+    price_sums = PrefixSums(prices)
+    result = {}
+
+    for window in ma_windows:
+        result[f'MA{window}'] = price_sums.mean(window)
+
+    returns = pct_change(prices)
+    result['daily_return'] = returns
+    if vol_window is not None:
+        result['volatility'] = PrefixSums(returns).std(vol_window) * np.sqrt(vol_window)
+
+    if rsi_period is not None:
+        deltas = np.full(len(prices), np.nan)
+        deltas[1:] = np.diff(prices)
+        result['RSI'] = rsi_from_deltas(deltas, rsi_period)
+
+    if 'ema' in extras:
+        for span in EMA_SPANS:
+            result[f'EMA{span}'] = ema(prices, span)
+
+    if 'macd' in extras:
+        fast, slow, signal = MACD_SPANS
+        macd = ema(prices, fast) - ema(prices, slow)
+        result['MACD'] = macd
+        result['MACD_signal'] = ema(macd, signal)
+        result['MACD_hist'] = macd - result['MACD_signal']
+
+    if 'bollinger' in extras:
+        middle = price_sums.mean(BOLLINGER_WINDOW)
+        width = price_sums.std(BOLLINGER_WINDOW) * BOLLINGER_WIDTH
+        result['BB_middle'] = middle
+        result['BB_upper'] = middle + width
+        result['BB_lower'] = middle - width
+
+    return result
+
+
+class RollingWindow:
+    """固定长度的滚动窗口，维护窗口内的和与平方和，每次更新 O(1)"""
+
+    RESYNC_EVERY = 10000  # 每隔若干次更新重新求和，避免浮点误差累积
+
+    def __init__(self, size, values=()):
+        self.size = size
+        self.values = deque(values, maxlen=size)
+        self._resync()
+
+    def _resync(self):
+        self.sum = math.fsum(self.values)
+        self.sumsq = math.fsum(v * v for v in self.values)
+        self.nonzero = sum(1 for v in self.values if v != 0)
+        self._updates = 0
+
+    def push(self, value):
+        if len(self.values) == self.size:
+            old = self.values[0]
+            self.sum -= old
+            self.sumsq -= old * old
+            self.nonzero -= old != 0
+        self.values.append(value)
+        self.sum += value
+        self.sumsq += value * value
+        self.nonzero += value != 0
+
+        self._updates += 1
+        if self._updates >= self.RESYNC_EVERY:
+            self._resync()
+
+    @property
+    def full(self):
+        return len(self.values) == self.size
+
+    def mean(self):
+        return self.sum / self.size if self.full else math.nan
+
+    def std(self, ddof=1):
+        if not self.full:
+            return math.nan
+        var = (self.sumsq - self.sum * self.sum / self.size) / (self.size - ddof)
+        return math.sqrt(max(var, 0.0))
+
+
+class StreamingIndicators:
+    """均线、滚动波动率和 RSI 的增量计算状态
+
+    每次 update 只处理一个新观测值，耗时与历史长度无关；
+    结果与 compute_indicators 在同一位置的值一致。
+    """
+
+    def __init__(self, ma_windows=DEFAULT_MA_WINDOWS, vol_window=20, rsi_period=14):
+        self.ma_windows = tuple(ma_windows)
+        self.vol_window = vol_window
+        self.rsi_period = rsi_period
+        self.last_price = None
+        self.last_key = None
+        self.count = 0
+        self.prices = {window: RollingWindow(window) for window in self.ma_windows}
+        self.returns = RollingWindow(vol_window)
+        self.gains = RollingWindow(rsi_period)
+        self.losses = RollingWindow(rsi_period)
+
+    def update(self, price, key=None):
+        """加入一个新观测值（key 通常为日期），返回该位置的各指标值"""
+        price = float(price)
+        for window in self.prices.values():
+            window.push(price)
+
+        daily_return = math.nan
+        if self.last_price is not None:
+            daily_return = price / self.last_price - 1
+            delta = price - self.last_price
+            self.returns.push(daily_return)
+            self.gains.push(max(delta, 0.0))
+            self.losses.push(max(-delta, 0.0))
+
+        self.last_price = price
+        self.last_key = key
+        self.count += 1
+        return self.values(daily_return)
+
+    def values(self, daily_return=math.nan):
+        """当前各指标值"""
+        result = {f'MA{window}': rolling.mean() for window, rolling in self.prices.items()}
+        result['daily_return'] = daily_return
+        result['volatility'] = self.returns.std() * math.sqrt(self.vol_window)
+
+        if self.gains.full:
+            # 窗口内没有涨幅/跌幅时精确为0，不使用可能残留舍入误差的滚动和
+            gain = self.gains.sum if self.gains.nonzero else 0.0
+            loss = self.losses.sum if self.losses.nonzero else 0.0
+            if loss > 0:
+                result['RSI'] = 100 - 100 / (1 + gain / loss)
+            else:
+                result['RSI'] = 100.0 if gain > 0 else math.nan
+        else:
+            result['RSI'] = math.nan
+        return result
+
+    def to_dict(self):
+        """序列化为可保存为 JSON 的字典"""
+        return {
+            'ma_windows': list(self.ma_windows),
+            'vol_window': self.vol_window,
+            'rsi_period': self.rsi_period,
+            'last_price': self.last_price,
+            'last_key': self.last_key,
+            'count': self.count,
+            'prices': {str(window): list(rolling.values) for window, rolling in self.prices.items()},
+            'returns': list(self.returns.values),
+            'gains': list(self.gains.values),
+            'losses': list(self.losses.values),
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        """从 to_dict 的结果恢复状态"""
+        streaming = cls(state['ma_windows'], state['vol_window'], state['rsi_period'])
+        streaming.last_price = state['last_price']
+        streaming.last_key = state['last_key']
+        streaming.count = state['count']
+        streaming.prices = {int(window): RollingWindow(int(window), values)
+                            for window, values in state['prices'].items()}
+        streaming.returns = RollingWindow(streaming.vol_window, state['returns'])
+        streaming.gains = RollingWindow(streaming.rsi_period, state['gains'])
+        streaming.losses = RollingWindow(streaming.rsi_period, state['losses'])
+        return streaming
+
+    def matches(self, ma_windows=DEFAULT_MA_WINDOWS, vol_window=20, rsi_period=14):
+        """参数是否与给定配置一致（不一致时需要重新计算）"""
+        return (self.ma_windows == tuple(ma_windows) and self.vol_window == vol_window
+                and self.rsi_period == rsi_period)
@@ -0,0 +1,172 @@
+"""后台数据采集
+
+定时把最新行情和历史数据写入数据库，页面渲染只读取本地数据，
+不再由恰好遇到缓存失效的访问者承担数据源的网络延迟。
+
+通过环境变量 GOLD_INGEST_MODE 选择运行方式：
+- inline（默认）：页面渲染时按需获取数据（原有行为）
+- background：在 Streamlit 进程内启动后台采集线程，页面只读数据库
+- external：由独立进程采集，页面只读数据库：
+
+    python ingest.py                 # 按默认间隔持续运行
+    python ingest.py --interval 60   # 每60秒刷新一次行情
+    python ingest.py --once          # 只运行一次
+"""
+import argparse
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from database import save_gold_prices_bulk
+from gold_analysis import (INDICATOR_STATE, advance_indicator_state, fetch_gold_price,
+                           fetch_usd_cny_rate, get_china_gold_price, sync_history)
+
+logger = logging.getLogger(__name__)
+
+QUOTE_INTERVAL = 300  # 行情刷新间隔（秒）
+HISTORY_DAYS = 365    # 同步的历史数据天数，与页面滑块最大值一致
+
+
+class LogSink:
+    """代替 st.expander 接收同步过程中的调试信息，写入日志"""
+
+    def info(self, message):
+        logger.info(message)
+
+    def warning(self, message):
+        logger.warning(message)
+
+    def error(self, message):
+        logger.error(message)
+
+    def dataframe(self, df):
+        logger.warning("\n%s", df)
+
+
+def refresh_quote():
+    """获取最新行情并写入数据库，返回写入的记录，失败返回 None"""
+    international_price_usd, _, symbol = fetch_gold_price()
+    if international_price_usd is None:
+        logger.warning("所有黄金数据源都获取失败")
+        return None
+
+    usd_cny_rate, _ = fetch_usd_cny_rate()
+    if usd_cny_rate is None:
+        logger.warning("无法获取实时汇率，本次不更新行情")
+        return None
+
+    china_price_cny, premium_rate = get_china_gold_price(
+        international_price_usd, usd_cny_rate)
+    record = {
+        'date': datetime.now().strftime('%Y-%m-%d'),
+        'international_price_usd': international_price_usd,
+        'international_price_cny': international_price_usd * usd_cny_rate,
+        'china_price_cny': china_price_cny,
+        'usd_cny_rate': usd_cny_rate,
+        'premium_rate': premium_rate,
+    }
+    save_gold_prices_bulk(pd.DataFrame([record]))
+    logger.info("已从%s更新行情: $%.2f/盎司, 汇率 %.4f",
+                symbol, international_price_usd, usd_cny_rate)
+    return record
+
+
+def refresh_history(days=HISTORY_DAYS):
+    """增量同步最近 days 天的历史数据，返回是否全部同步成功"""
+    end_date = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=days)
+    return sync_history(start_date.strftime('%Y-%m-%d'),
+                        end_date.strftime('%Y-%m-%d'), LogSink())
+
+
+def refresh_indicators(days=HISTORY_DAYS, name=INDICATOR_STATE):
+    """用新同步的日线数据推进增量指标状态并保存检查点，返回最新指标值"""
+    values, last_date = advance_indicator_state(days, name)
+    logger.info("增量指标已更新到 %s", last_date)
+    return values
+
+
+class IngestionScheduler(threading.Thread):
+    """后台采集线程：启动后立即采集一次，之后每隔 interval 秒采集一次"""
+
+    def __init__(self, interval=QUOTE_INTERVAL, history_days=HISTORY_DAYS):
+        super().__init__(name="gold-ingestion", daemon=True)
+        self.interval = interval
+        self.history_days = history_days
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._status = {
+            'runs': 0,
+            'last_run': None,
+            'last_duration': None,
+            'last_error': None,
+        }
+
+    def run_once(self):
+        """采集一次行情和历史数据"""
+        start = time.perf_counter()
+        error = None
+        try:
+            refresh_quote()
+            refresh_history(self.history_days)
+            refresh_indicators(self.history_days)
+        except Exception as e:
+            error = str(e)
+            logger.exception("后台采集失败")
+
+        with self._lock:
+            self._status['runs'] += 1
+            self._status['last_run'] = datetime.now()
+            self._status['last_duration'] = time.perf_counter() - start
+            self._status['last_error'] = error
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.run_once()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+
+@st.cache_resource
+def start_background_ingestion(interval=QUOTE_INTERVAL):
+    """在当前进程内启动后台采集线程（每个进程只启动一次）"""
+    scheduler = IngestionScheduler(interval=interval)
+    scheduler.start()
+    return scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="黄金价格后台数据采集")
+    parser.add_argument("--interval", type=int, default=QUOTE_INTERVAL,
+                        help="行情刷新间隔（秒）")
+    parser.add_argument("--days", type=int, default=HISTORY_DAYS,
+                        help="同步的历史数据天数")
+    parser.add_argument("--once", action="store_true", help="只运行一次")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+
+    scheduler = IngestionScheduler(interval=args.interval, history_days=args.days)
+    if args.once:
+        scheduler.run_once()
+        return
+
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""实时行情面板
+
+每个进程只有一个采样线程按固定间隔获取行情，写入固定大小的 NumPy 环形缓冲区；
+所有会话共享这份缓冲区，页面上的实时面板是按间隔自动重新运行的片段，
+只重新渲染价格指标和走势小图，不会触发整页重新运行或各自请求数据源。
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from downsample import lttb_indices
+
+logger = logging.getLogger(__name__)
+
+LIVE_INTERVAL = int(os.environ.get("GOLD_LIVE_INTERVAL", "15"))  # 采样间隔（秒）
+LIVE_CAPACITY = 12 * 3600 // LIVE_INTERVAL  # 缓冲区保留约12小时的数据
+SPARKLINE_POINTS = 300  # 走势小图最多显示的点数
+LIVE_IDLE_INTERVALS = 4  # 超过这么多个采样间隔没有会话读取时暂停采样，节省数据源请求预算
+
+
+class RingBuffer:
+    """固定容量的环形缓冲区，写满后覆盖最早的数据；线程安全"""
+
+    def __init__(self, capacity, columns=('price', 'rate')):
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        self._times = np.zeros(capacity)
+        self._values = np.zeros((capacity, len(self.columns)))
+        self._next = 0   # 下一个写入位置
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, *values):
+        with self._lock:
+            self._times[self._next] = timestamp
+            self._values[self._next] = values
+            self._next = (self._next + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def __len__(self):
+        return self._size
+
+    def snapshot(self):
+        """按时间顺序返回 (时间戳数组, {列名: 数组}) 的副本"""
+        with self._lock:
+            if self._size < self.capacity:
+                order = np.arange(self._size)
+            else:
+                order = (np.arange(self.capacity) + self._next) % self.capacity
+            times = self._times[order]
+            values = self._values[order]
+        return times, {col: values[:, i] for i, col in enumerate(self.columns)}
+
+
+class LiveTicker(threading.Thread):
+    """后台采样线程：每隔 interval 秒调用 fetch() 获取 (金价, 汇率) 并写入缓冲区
+
+    fetch() 返回 None 表示采样失败；也可以返回 (金价, 汇率, 版本)，
+    版本和价格与上次采样相同（行情源尚未更新）时不写入缓冲区。
+    页面每次读取时调用 touch()；超过 idle_intervals 个间隔无人读取时暂停采样，
+    下次读取时立即恢复。
+    """
+
+    def __init__(self, fetch, interval=LIVE_INTERVAL, capacity=LIVE_CAPACITY,
+                 idle_intervals=LIVE_IDLE_INTERVALS):
+        super().__init__(name="gold-live-ticker", daemon=True)
+        self.fetch = fetch
+        self.interval = interval
+        self.idle_timeout = interval * idle_intervals
+        self.buffer = RingBuffer(capacity)
+        self.errors = 0
+        self.unchanged = 0
+        self.last_read = time.monotonic()
+        self._last_quote = None
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+
+    def touch(self):
+        """记录一次读取，暂停中的采样随之恢复"""
+        self.last_read = time.monotonic()
+        self._wake_event.set()
+
+    @property
+    def idle(self):
+        return time.monotonic() - self.last_read > self.idle_timeout
+
+    def poll_once(self):
+        try:
+            quote = self.fetch()
+        except Exception:
+            logger.exception("实时行情采样失败")
+            quote = None
+        if quote is None:
+            self.errors += 1
+            return False
+        if len(quote) > 2:
+            if quote == self._last_quote:
+                self.unchanged += 1
+                return False
+            self._last_quote = quote
+        self.buffer.append(time.time(), *quote[:2])
+        return True
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.idle:
+                self._wake_event.clear()
+                if self.idle:  # 清除事件前可能刚好有读取，再检查一次
+                    self._wake_event.wait()
+                continue
+            self.poll_once()
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+
+
+def sparkline_frame(times, prices, max_points=SPARKLINE_POINTS):
+    """走势小图数据，点数过多时用 LTTB 降采样"""
+    indices = lttb_indices(times, prices, max_points)
+    index = pd.to_datetime(times[indices], unit='s', utc=True).tz_convert(None)
+    return pd.DataFrame({'金价(美元/盎司)': prices[indices]}, index=index)
+
+
+@st.fragment(run_every=LIVE_INTERVAL)
+def show_live_panel(ticker):
+    """实时价格指标和走势小图，每隔 LIVE_INTERVAL 秒只重新运行本片段"""
+    ticker.touch()  # 有会话在看，保持采样
+    times, values = ticker.buffer.snapshot()
+    if len(times) == 0:
+        st.info("正在等待第一笔实时行情...")
+        return
+
+    prices, rates = values['price'], values['rate']
+    delta = f"{prices[-1] - prices[-2]:+.2f}" if len(prices) > 1 else None
+
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        st.metric("实时金价(美元/盎司)", f"${prices[-1]:.2f}", delta=delta)
+    with col2:
+        st.metric("实时汇率", f"{rates[-1]:.4f}")
+    with col3:
+        st.line_chart(sparkline_frame(times, prices), height=120)
+
+    updated = datetime.fromtimestamp(times[-1]).strftime('%H:%M:%S')
+    st.caption(f"最近更新 {updated}，缓冲区 {len(times)}/{ticker.buffer.capacity} 个数据点，"
+               f"每 {ticker.interval} 秒刷新")
@@ -0,0 +1,385 @@
+"""行情数据源
+
+所有数据源返回统一格式的日线数据：DatetimeIndex 索引，
+Open/High/Low/Close/Volume 单层列，区间为 [start, end)。
+
+通过环境变量选择数据源：
+- GOLD_PRICE_PROVIDER: yahoo（默认）/ metalpriceapi / replay
+- METAL_PRICE_API_KEY / METAL_PRICE_API_BASE_URL: MetalpriceAPI 配置
+- GOLD_REPLAY_DIR: 回放数据目录，默认 replay_data
+- GOLD_REPLAY_ANCHOR: today（默认，按整周平移使最后一根K线落在最近的交易日）/ recorded（按原始日期回放）
+
+录制回放数据：
+
+    python price_providers.py record 365
+"""
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+import requests
+import yfinance as yf
+
+# MetalpriceAPI配置
+METAL_PRICE_API_KEY = os.environ.get(
+    "METAL_PRICE_API_KEY", "YOUR_API_KEY")  # 需要替换为您的API密钥
+METAL_PRICE_API_BASE_URL = os.environ.get(
+    "METAL_PRICE_API_BASE_URL", "https://api.metalpriceapi.com/v1")
+
+# 回放数据配置
+REPLAY_DIR = os.environ.get("GOLD_REPLAY_DIR", "replay_data")
+REPLAY_ANCHOR = os.environ.get("GOLD_REPLAY_ANCHOR", "today")
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# yfinance 0.2.x 的 yf.download 把结果写在进程全局的 shared._DFS / shared._ERRORS 中，
+# 并发调用会互相覆盖；并发请求、后台采集和实时行情都会调用，必须串行化
+_yf_download_lock = threading.Lock()
+
+
+class ProviderError(Exception):
+    """数据源请求失败（网络、限流等），区别于请求成功但区间内没有数据（如休市）"""
+
+
+def normalize_bars(data):
+    """将数据整理为统一格式：单层列、无时区的升序日期索引"""
+    if data is None or data.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+
+    data = data.copy()
+    if isinstance(data.columns, pd.MultiIndex):
+        # yfinance 单个代码时返回 (Price, Ticker) 两级列
+        data.columns = data.columns.get_level_values(0)
+    data.index = pd.to_datetime(data.index)
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    data = data[[col for col in BAR_COLUMNS if col in data.columns]]
+    return data[~data.index.duplicated(keep='last')].sort_index()
+
+
+def last_closes(bars_by_symbol):
+    """从 {代码: K线数据} 中提取各代码最新的收盘价，没有数据的代码不包含在结果中"""
+    prices = {}
+    for symbol, bars in bars_by_symbol.items():
+        if bars is None or bars.empty or 'Close' not in bars:
+            continue
+        close = pd.to_numeric(bars['Close'], errors='coerce').dropna()
+        if not close.empty:
+            prices[symbol] = float(close.iloc[-1])
+    return prices
+
+
+class PriceProvider:
+    """数据源接口"""
+
+    name = 'base'
+    label = '数据源'
+    rate_limited = True  # 是否需要经过共享限流器
+
+    def download(self, symbol, start, end, timeout=10):
+        """下载 [start, end) 区间的日线数据，日期为 'YYYY-MM-DD' 字符串
+
+        请求失败时抛出异常；区间内没有交易日时返回空数据。
+        """
+        raise NotImplementedError
+
+    def download_many(self, symbols, start, end, timeout=10):
+        """批量下载多个代码，返回 {代码: 日线数据}
+
+        默认逐个下载，支持批量接口的数据源应覆盖此方法，一次请求获取全部代码。
+        """
+        return {symbol: self.download(symbol, start, end, timeout) for symbol in symbols}
+
+    def latest_prices(self, symbols, timeout=10):
+        """获取多个代码的最新价格，返回 {代码: 价格}，没有报价的代码不包含在结果中
+
+        默认取包含今天在内的日线的最新收盘价（交易时段内为当日 K 线的最新价）；
+        支持分钟线或实时报价的数据源应覆盖此方法。
+        """
+        start = (datetime.now() - timedelta(days=5)).strftime('%Y-%m-%d')
+        end = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+        return last_closes(self.download_many(symbols, start, end, timeout))
+
+
+class YahooProvider(PriceProvider):
+    """Yahoo Finance 数据源"""
+
+    name = 'yahoo'
+    label = 'Yahoo Finance'
+
+    @staticmethod
+    def _yf_download(tickers, **kwargs):
+        """串行调用 yf.download
+
+        yf.download 不抛出异常，失败的代码返回空数据并把错误记在 shared._ERRORS 中。
+        没有任何代码返回数据且存在“无价格数据”以外的错误时抛出 ProviderError，
+        使调用方能区分请求失败和区间内休市。
+        """
+        with _yf_download_lock:
+            data = yf.download(tickers, progress=False, ignore_tz=True, **kwargs)
+            errors = dict(getattr(getattr(yf, 'shared', None), '_ERRORS', None) or {})
+
+        failures = {symbol: error for symbol, error in errors.items()
+                    if 'YFPricesMissingError' not in error and 'no price data found' not in error}
+        if failures and (data is None or data.dropna(how='all').empty):
+            raise ProviderError(f"Yahoo Finance 请求失败: {failures}")
+        return data
+
+    def download(self, symbol, start, end, timeout=10):
+        data = self._yf_download(
+            symbol,
+            start=start,
+            end=end,
+            threads=False,  # 禁用多线程可能更稳定
+            timeout=timeout
+        )
+        return normalize_bars(data)
+
+    def download_many(self, symbols, start, end, timeout=10):
+        symbols = list(dict.fromkeys(symbols))
+        data = self._yf_download(
+            symbols,
+            start=start,
+            end=end,
+            group_by='ticker',
+            timeout=timeout
+        )
+        return self._split_tickers(data, symbols)
+
+    def latest_prices(self, symbols, timeout=10):
+        """当日（休市时为最近一个交易日）1分钟线的最新收盘价"""
+        symbols = list(dict.fromkeys(symbols))
+        data = self._yf_download(
+            symbols,
+            period='1d',
+            interval='1m',
+            group_by='ticker',
+            timeout=timeout
+        )
+        return last_closes(self._split_tickers(data, symbols))
+
+    @staticmethod
+    def _split_tickers(data, symbols):
+        """将 group_by='ticker' 的批量下载结果拆分为 {代码: K线数据}"""
+        result = {}
+        tickers = set(data.columns.get_level_values(0)) if isinstance(
+            data.columns, pd.MultiIndex) else set()
+        for symbol in symbols:
+            if symbol in tickers:
+                # 各代码的交易日不同，去掉合并后全为空的行
+                result[symbol] = normalize_bars(data[symbol].dropna(how='all'))
+            else:
+                result[symbol] = pd.DataFrame(columns=BAR_COLUMNS)
+        return result
+
+
+class MetalPriceApiProvider(PriceProvider):
+    """MetalpriceAPI 数据源，只支持黄金和美元兑人民币汇率"""
+
+    name = 'metalpriceapi'
+    label = 'MetalpriceAPI'
+
+    # 代码到 MetalpriceAPI 货币代码的映射
+    SYMBOLS = {
+        "GC=F": "XAU",
+        "XAUUSD=X": "XAU",
+        "CNY=X": "CNY",
+        "USDCNY=X": "CNY",
+    }
+    MAX_DAYS = 365  # timeframe 接口单次最多查询365天
+
+    def __init__(self, api_key=METAL_PRICE_API_KEY, base_url=METAL_PRICE_API_BASE_URL):
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def _fetch_timeframe(self, currency, start, end, timeout):
+        """查询 [start, end]（含两端）区间的日汇率"""
+        response = requests.get(
+            f"{self.base_url}/timeframe",
+            params={
+                'api_key': self.api_key,
+                'start_date': start.strftime('%Y-%m-%d'),
+                'end_date': end.strftime('%Y-%m-%d'),
+                'base': 'USD',
+                'currencies': currency,
+            },
+            timeout=timeout
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if not payload.get('success', False):
+            raise ValueError(f"MetalpriceAPI 返回错误: {payload.get('error')}")
+        return payload.get('rates', {})
+
+    def _download_currencies(self, currencies, start, end, timeout):
+        """一次请求查询多个货币 [start, end) 区间的日报价，返回 {货币: 收盘价序列}"""
+        start_date = pd.Timestamp(start)
+        last_date = pd.Timestamp(end) - timedelta(days=1)
+        values = {currency: {} for currency in currencies}
+
+        while start_date <= last_date:
+            chunk_end = min(start_date + timedelta(days=self.MAX_DAYS - 1), last_date)
+            rates = self._fetch_timeframe(
+                ','.join(currencies), start_date, chunk_end, timeout)
+            for date, day_rates in rates.items():
+                for currency in currencies:
+                    rate = day_rates.get(currency)
+                    if not rate:
+                        continue
+                    # 以美元为基准时 XAU 报价为每美元可兑换的盎司数，取倒数得到每盎司美元价格
+                    values[currency][pd.Timestamp(date)] = 1 / rate if currency == "XAU" else rate
+            start_date = chunk_end + timedelta(days=1)
+
+        return {currency: pd.Series(daily, dtype=float).sort_index()
+                for currency, daily in values.items()}
+
+    @staticmethod
+    def _to_bars(close):
+        if close.empty:
+            return pd.DataFrame(columns=BAR_COLUMNS)
+        return pd.DataFrame({
+            'Open': close, 'High': close, 'Low': close, 'Close': close, 'Volume': 0
+        })
+
+    def download(self, symbol, start, end, timeout=10):
+        return self.download_many([symbol], start, end, timeout)[symbol]
+
+    def latest_prices(self, symbols, timeout=10):
+        """latest 接口的实时报价"""
+        currencies = sorted({self.SYMBOLS[symbol]
+                            for symbol in symbols if symbol in self.SYMBOLS})
+        if not currencies:
+            return {}
+        response = requests.get(
+            f"{self.base_url}/latest",
+            params={'api_key': self.api_key, 'base': 'USD', 'currencies': ','.join(currencies)},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        payload = response.json()
+        if not payload.get('success', False):
+            raise ValueError(f"MetalpriceAPI 返回错误: {payload.get('error')}")
+
+        rates = payload.get('rates', {})
+        prices = {}
+        for symbol in symbols:
+            currency = self.SYMBOLS.get(symbol)
+            rate = rates.get(currency)
+            if rate:
+                prices[symbol] = 1 / rate if currency == "XAU" else rate
+        return prices
+
+    def download_many(self, symbols, start, end, timeout=10):
+        currencies = sorted({self.SYMBOLS[symbol]
+                            for symbol in symbols if symbol in self.SYMBOLS})
+        closes = self._download_currencies(
+            currencies, start, end, timeout) if currencies else {}
+
+        result = {}
+        for symbol in symbols:
+            currency = self.SYMBOLS.get(symbol)
+            close = closes.get(currency, pd.Series(dtype=float))
+            result[symbol] = self._to_bars(close)
+        return result
+
+
+class ReplayProvider(PriceProvider):
+    """本地回放数据源，从磁盘读取录制的日线数据，不访问网络"""
+
+    name = 'replay'
+    label = '本地回放数据'
+    rate_limited = False
+
+    def __init__(self, directory=REPLAY_DIR, anchor=REPLAY_ANCHOR):
+        self.directory = directory
+        self.anchor = anchor
+        self._bars = {}
+
+    def path(self, symbol):
+        return os.path.join(self.directory, f"{symbol.replace('/', '_')}.csv")
+
+    def load(self, symbol):
+        """读取某个代码的全部录制数据（带内存缓存）"""
+        if symbol not in self._bars:
+            path = self.path(symbol)
+            if os.path.exists(path):
+                bars = normalize_bars(pd.read_csv(
+                    path, index_col=0, parse_dates=True))
+                if self.anchor == 'today' and not bars.empty:
+                    # 按整周平移，保持星期分布不变
+                    gap = datetime.now() - timedelta(days=1) - bars.index.max()
+                    bars.index = bars.index + \
+                        timedelta(weeks=max(gap.days // 7, 0))
+            else:
+                bars = pd.DataFrame(columns=BAR_COLUMNS)
+            self._bars[symbol] = bars
+        return self._bars[symbol]
+
+    def download(self, symbol, start, end, timeout=10):
+        bars = self.load(symbol)
+        if bars.empty:
+            return bars
+        return bars[(bars.index >= pd.Timestamp(start)) & (bars.index < pd.Timestamp(end))].copy()
+
+    def record(self, symbol, bars):
+        """将日线数据写入回放目录"""
+        os.makedirs(self.directory, exist_ok=True)
+        normalize_bars(bars).to_csv(self.path(symbol), index_label='Date')
+        self._bars.pop(symbol, None)
+
+
+PROVIDERS = {
+    'yahoo': YahooProvider,
+    'metalpriceapi': MetalPriceApiProvider,
+    'replay': ReplayProvider,
+}
+
+_provider = None
+
+
+def get_provider():
+    """返回当前配置的数据源（进程内单例）"""
+    global _provider
+    if _provider is None:
+        name = os.environ.get("GOLD_PRICE_PROVIDER", "yahoo").lower()
+        if name not in PROVIDERS:
+            raise ValueError(
+                f"未知的数据源: {name}，可选: {', '.join(PROVIDERS)}")
+        _provider = PROVIDERS[name]()
+    return _provider
+
+
+def set_provider(provider):
+    """替换当前数据源，例如在基准测试中使用回放数据"""
+    global _provider
+    _provider = provider
+
+
+def record_replay_data(symbols, days=365, source=None, directory=REPLAY_DIR):
+    """从在线数据源录制最近 days 天的数据到回放目录，返回每个代码的记录数"""
+    source = source or YahooProvider()
+    replay = ReplayProvider(directory)
+    end = datetime.now().strftime('%Y-%m-%d')
+    start = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+
+    counts = {}
+    for symbol in symbols:
+        bars = source.download(symbol, start, end)
+        if not bars.empty:
+            replay.record(symbol, bars)
+        counts[symbol] = len(bars)
+    return counts
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "record":
+        from gold_analysis import PRIMARY_GOLD_SYMBOLS, BACKUP_GOLD_SYMBOLS, EXCHANGE_SYMBOLS
+
+        days = int(sys.argv[2]) if len(sys.argv) >= 3 else 365
+        symbols = [s for s, _ in PRIMARY_GOLD_SYMBOLS + BACKUP_GOLD_SYMBOLS] + EXCHANGE_SYMBOLS
+        for symbol, count in record_replay_data(symbols, days).items():
+            print(f"{symbol}: {count}条记录")
+    else:
+        print(__doc__)
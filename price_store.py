@@ -0,0 +1,296 @@
+"""内存映射的列式价格存储
+
+每个数据序列一个目录，数据按追加顺序写成若干段，每段每列一个 .npy 文件：
+
+    price_store/
+        gold_history/
+            manifest.json
+            seg_000001/ts.npy, international_price_usd.npy, ...
+            seg_000002/...
+
+读取时以 mmap 方式打开，只有实际切片到的页面才会读入内存，
+因此多年日线或分钟线数据也能在毫秒级打开；区间落在单个段内时切片为零拷贝视图。
+同一时间戳出现在多个段中时，以后写入的段为准。
+
+页面进程和后台采集进程（ingest.py）可能同时读写同一个存储，
+写入和合并持有目录下 .lock 文件的排他锁，读取持有共享锁。
+"""
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+
+STORE_DIR = os.environ.get("GOLD_STORE_DIR", "price_store")
+MAX_SEGMENTS = 32  # 段数超过该值时自动合并
+
+PRICE_COLUMNS = ['international_price_usd', 'international_price_cny',
+                 'china_price_cny', 'usd_cny_rate', 'premium_rate']
+
+
+def _lock_file(f, exclusive):
+    """对已打开的锁文件加锁，阻塞直到获得锁；Windows 下只支持排他锁"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    else:
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:  # LK_LOCK 重试约10秒后仍未获得锁
+                continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def to_keys(values, unit='D'):
+    """将日期/时间（字符串或 datetime）转换为 int64 时间戳，单位为 unit（'D' 天、'm' 分钟等）"""
+    values = np.asarray(values)
+    if values.dtype.kind not in 'mM':
+        values = pd.to_datetime(values).values if unit != 'D' else \
+            values.astype(str).astype('datetime64[D]')
+    return values.astype(f'datetime64[{unit}]').astype('int64')
+
+
+def from_keys(keys, unit='D'):
+    """将 int64 时间戳还原为 datetime64 数组"""
+    return np.asarray(keys).astype(f'datetime64[{unit}]')
+
+
+class ColumnStore:
+    """追加写入、内存映射读取的列式存储"""
+
+    def __init__(self, series, columns=PRICE_COLUMNS, root=STORE_DIR, unit='D'):
+        self.path = os.path.join(root, series)
+        self.columns = list(columns)
+        self.unit = unit
+        self._lock = threading.Lock()
+        self._local = threading.local()  # 当前线程是否已持有文件锁
+        self._manifest = None
+        self._manifest_mtime = None
+        self._segments = {}  # 段名 -> {列名: mmap 数组}
+
+    # ---- 跨进程锁 ----
+
+    @contextmanager
+    def _file_lock(self, exclusive=False):
+        """持有存储目录的文件锁，exclusive=False 时为共享锁；同一线程内可重入"""
+        if getattr(self._local, 'locked', False):
+            yield  # 例如写入时读取清单，已持有排他锁
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, '.lock'), 'a+b') as f:
+            _lock_file(f, exclusive)
+            self._local.locked = True
+            try:
+                yield
+            finally:
+                self._local.locked = False
+                _unlock_file(f)
+
+    # ---- 元数据 ----
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def manifest(self):
+        """读取段清单；其他进程（如后台采集）更新后自动重新加载"""
+        with self._file_lock():
+            return self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            mtime = os.path.getmtime(self._manifest_path)
+        except OSError:
+            # 存储目录不存在或已被删除，丢弃缓存的段
+            self._manifest = None
+            self._segments = {}
+            return {'next_id': 1, 'segments': []}
+
+        if self._manifest is None or mtime != self._manifest_mtime:
+            with open(self._manifest_path, encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+            # 清理已不在清单中的段
+            names = {seg['name'] for seg in self._manifest['segments']}
+            self._segments = {name: arrays for name, arrays in self._segments.items()
+                              if name in names}
+        return self._manifest
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path)  # 原子替换，读取方不会看到写了一半的清单
+        self._manifest = None
+
+    def rows(self):
+        """已写入的总行数（含被后续段覆盖的重复时间戳）"""
+        return sum(seg['rows'] for seg in self.manifest()['segments'])
+
+    def version(self):
+        """廉价的数据版本标识：(写入序号, 总行数, 最大时间戳)
+
+        写入序号即清单中的 next_id，每次追加和合并都会递增，
+        因此合并后重新写入相同日期（如刷新末尾数据）也会得到新的版本。
+        """
+        manifest = self.manifest()
+        segments = manifest['segments']
+        return (manifest['next_id'], sum(seg['rows'] for seg in segments),
+                max((seg['end'] for seg in segments), default=None))
+
+    def bounds(self):
+        """返回已存储数据的 (最小时间戳, 最大时间戳)，没有数据返回 None"""
+        segments = self.manifest()['segments']
+        if not segments:
+            return None
+        return min(seg['start'] for seg in segments), max(seg['end'] for seg in segments)
+
+    # ---- 写入 ----
+
+    def _write_segment(self, manifest, keys, columns):
+        name = f"seg_{manifest['next_id']:06d}"
+        segment_path = os.path.join(self.path, name)
+        os.makedirs(segment_path, exist_ok=True)
+        np.save(os.path.join(segment_path, 'ts.npy'), keys)
+        for col in self.columns:
+            np.save(os.path.join(segment_path, f'{col}.npy'), columns[col])
+
+        manifest['next_id'] += 1
+        manifest['segments'].append({
+            'name': name,
+            'start': int(keys[0]),
+            'end': int(keys[-1]),
+            'rows': int(len(keys)),
+        })
+
+    def append(self, df, time_column='date'):
+        """追加一段数据，返回写入行数"""
+        if df is None or df.empty:
+            return 0
+
+        keys = to_keys(df[time_column], self.unit)
+        order = np.argsort(keys, kind='stable')
+        columns = {col: df[col].to_numpy(dtype=float)[order] for col in self.columns}
+
+        with self._lock, self._file_lock(exclusive=True):
+            # 其他进程可能刚写过清单（mtime 精度不足时缓存判断不出），持锁后重新读取
+            self._manifest = None
+            manifest = self._load_manifest()
+            manifest = {'next_id': manifest['next_id'],
+                        'segments': list(manifest['segments'])}
+            self._write_segment(manifest, keys[order], columns)
+            self._write_manifest(manifest)
+
+        if len(manifest['segments']) > MAX_SEGMENTS:
+            self.compact()
+        return len(keys)
+
+    def compact(self):
+        """将所有段合并为一段（去除被覆盖的重复时间戳），返回合并后的行数"""
+        with self._lock, self._file_lock(exclusive=True):
+            self._manifest = None
+            manifest = self._load_manifest()
+            if len(manifest['segments']) <= 1:
+                return sum(seg['rows'] for seg in manifest['segments'])
+
+            keys, columns = self._read_all(manifest['segments'])
+            old_names = [seg['name'] for seg in manifest['segments']]
+            new_manifest = {'next_id': manifest['next_id'], 'segments': []}
+            self._write_segment(new_manifest, keys, columns)
+            self._write_manifest(new_manifest)
+
+            # 持有排他锁，其他进程不会在读取旧清单后再打开这些段；已打开的 mmap 不受删除影响
+            for name in old_names:
+                self._segments.pop(name, None)
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+            return len(keys)
+
+    # ---- 读取 ----
+
+    def _open_segment(self, name):
+        arrays = self._segments.get(name)
+        if arrays is None:
+            segment_path = os.path.join(self.path, name)
+            arrays = {col: np.load(os.path.join(segment_path, f'{col}.npy'), mmap_mode='r')
+                      for col in ['ts'] + self.columns}
+            self._segments[name] = arrays
+        return arrays
+
+    def _read_all(self, segments, start=None, end=None, columns=None):
+        """读取 [start, end) 区间，返回 (时间戳, {列名: 数组})"""
+        columns = self.columns if columns is None else columns
+        pieces = []
+        for seg in segments:
+            if (start is not None and seg['end'] < start) or (end is not None and seg['start'] >= end):
+                continue
+            arrays = self._open_segment(seg['name'])
+            ts = arrays['ts']
+            lo = 0 if start is None else np.searchsorted(ts, start, side='left')
+            hi = len(ts) if end is None else np.searchsorted(ts, end, side='left')
+            if hi > lo:
+                pieces.append((ts[lo:hi], {col: arrays[col][lo:hi] for col in columns}))
+
+        if not pieces:
+            return np.empty(0, dtype='int64'), {col: np.empty(0) for col in columns}
+        if len(pieces) == 1:
+            return pieces[0]  # 单段内的区间直接返回 mmap 视图，不拷贝
+
+        # 多段时合并：按时间戳稳定排序，同一时间戳保留最后写入的段
+        keys = np.concatenate([ts for ts, _ in pieces])
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        keep = np.append(keys[1:] != keys[:-1], True)
+        result = {col: np.concatenate([cols[col] for _, cols in pieces])[order][keep]
+                  for col in columns}
+        return keys[keep], result
+
+    def read(self, start=None, end=None, columns=None):
+        """按时间区间 [start, end) 读取，start/end 可以是日期字符串或时间戳"""
+        if start is not None and not isinstance(start, (int, np.integer)):
+            start = int(to_keys([start], self.unit)[0])
+        if end is not None and not isinstance(end, (int, np.integer)):
+            end = int(to_keys([end], self.unit)[0])
+        # 读取清单和打开段期间持有共享锁，避免段被其他进程合并删除
+        with self._file_lock():
+            return self._read_all(self._load_manifest()['segments'], start, end, columns)
+
+    def to_frame(self, start=None, end=None, columns=None):
+        """按时间区间 [start, end) 读取为 DataFrame，日线数据的 date 列为 'YYYY-MM-DD' 字符串"""
+        keys, data = self.read(start, end, columns)
+        times = from_keys(keys, self.unit)
+        frame = {'date': np.datetime_as_string(times, unit='D') if self.unit == 'D' else times}
+        frame.update(data)
+        return pd.DataFrame(frame)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(series='gold_history', unit='D'):
+    """返回进程内共享的存储实例"""
+    with _stores_lock:
+        store = _stores.get((series, unit))
+        if store is None:
+            store = ColumnStore(series, unit=unit)
+            _stores[(series, unit)] = store
+        return store
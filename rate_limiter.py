@@ -0,0 +1,144 @@
+"""数据源请求限流
+
+进程内所有会话共享同一个限流器：
+- 令牌桶：预算充足时请求立即发出，超出预算时才等待
+- 指数退避 + 随机抖动：只在上游失败（限流、超时等）时放慢
+- 按代码熔断：某个代码连续失败后暂停请求一段时间
+"""
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """线程安全的令牌桶"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate  # 每秒补充的令牌数
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """获取一个令牌，必要时等待，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity,
+                                   self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+            waited += wait_time
+
+
+class CircuitBreaker:
+    """单个代码的熔断器：连续失败达到阈值后熔断，冷却后允许一次试探请求"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        """是否允许发出请求"""
+        if self.opened_at is None:
+            return True
+        # 冷却结束后进入半开状态，允许一次试探
+        return time.monotonic() - self.opened_at >= self.reset_timeout
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None and not self.allow()
+
+
+class RateLimiter:
+    """令牌桶限流 + 指数退避 + 按代码熔断，并统计等待时间"""
+
+    def __init__(self, rate=2.0, capacity=5, base_backoff=0.5, max_backoff=30.0,
+                 failure_threshold=3, reset_timeout=60.0):
+        self.bucket = TokenBucket(rate, capacity)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,            # 放行的请求数
+            'throttled': 0,           # 因超出预算而等待的请求数
+            'throttle_wait_seconds': 0.0,
+            'backoffs': 0,            # 失败后退避的次数
+            'backoff_wait_seconds': 0.0,
+            'failures': 0,
+            'rejected': 0,            # 因熔断被拒绝的请求数
+        }
+
+    def _breaker(self, symbol):
+        breaker = self._breakers.get(symbol)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self._breakers[symbol] = breaker
+        return breaker
+
+    def acquire(self, symbol):
+        """请求发出前调用；熔断中返回 False，否则按预算等待后返回 True"""
+        with self._lock:
+            if not self._breaker(symbol).allow():
+                self._stats['rejected'] += 1
+                return False
+
+        waited = self.bucket.acquire()
+
+        with self._lock:
+            self._stats['requests'] += 1
+            if waited > 0:
+                self._stats['throttled'] += 1
+                self._stats['throttle_wait_seconds'] += waited
+        return True
+
+    def backoff(self, attempt):
+        """第 attempt 次失败后的退避等待（指数增长，完全随机抖动）"""
+        wait_time = random.uniform(
+            0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        time.sleep(wait_time)
+        with self._lock:
+            self._stats['backoffs'] += 1
+            self._stats['backoff_wait_seconds'] += wait_time
+        return wait_time
+
+    def record_success(self, symbol):
+        with self._lock:
+            self._breaker(symbol).record_success()
+
+    def record_failure(self, symbol):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._breaker(symbol).record_failure()
+
+    def stats(self):
+        """返回计数器快照，包括当前熔断中的代码"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open_circuits'] = sorted(
+                symbol for symbol, breaker in self._breakers.items() if breaker.is_open)
+        return stats
+
+
+# 进程级共享实例
+rate_limiter = RateLimiter()
@@ -1,17 +1,16 @@
 import streamlit as st
 import pandas as pd
-import yfinance as yf
 from datetime import datetime, timedelta
+from price_providers import get_provider
 
 
 def safe_download(symbol):
     """安全地下载数据"""
     try:
-        data = yf.download(
+        data = get_provider().download(
             symbol,
             start=(datetime.now() - timedelta(days=5)).strftime('%Y-%m-%d'),
-            end=datetime.now().strftime('%Y-%m-%d'),
-            progress=False
+            end=datetime.now().strftime('%Y-%m-%d')
         )
         return data
     except Exception as e:
@@ -24,6 +23,7 @@ def main():
 
     with st.expander("调试信息", expanded=True):
         st.write("这是一个简化版应用，用于排查错误")
+        st.write(f"当前数据源: {get_provider().label}")
 
     st.info("正在尝试获取数据...")
 
@@ -1,25 +1,25 @@
 import streamlit as st
-import yfinance as yf
 from datetime import datetime, timedelta
 import pandas as pd
+from price_providers import get_provider
 
-st.title("Yahoo Finance连接测试")
+provider = get_provider()
 
-st.write("这是一个极简版的测试应用，仅测试与Yahoo Finance的连接。")
+st.title(f"{provider.label}连接测试")
+
+st.write(f"这是一个极简版的测试应用，仅测试与{provider.label}的连接。")
 
 
 @st.cache_data
 def get_test_data():
     try:
-        st.info("尝试从Yahoo Finance获取数据...")
+        st.info(f"尝试从{provider.label}获取数据...")
         # 尝试获取黄金数据，设置非常短的超时
-        data = yf.download(
+        data = provider.download(
             "GC=F",  # 黄金期货
             start=(datetime.now() - timedelta(days=2)).strftime('%Y-%m-%d'),
             end=datetime.now().strftime('%Y-%m-%d'),
-            progress=False,
-            timeout=5,
-            threads=False
+            timeout=5
         )
         if not data.empty:
             return True, data
@@ -33,7 +33,7 @@ if st.button("测试连接"):
     success, result = get_test_data()
 
     if success:
-        st.success("成功连接到Yahoo Finance!")
+        st.success(f"成功连接到{provider.label}!")
         st.write("获取到的数据:")
         st.dataframe(result.head())
     else:
@@ -0,0 +1,69 @@
+"""indicators.py 与 pandas rolling 实现的一致性测试"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from indicators import StreamingIndicators, compute_indicators, indicator_grids  # noqa: E402
+
+
+def pandas_rsi(prices, periods):
+    """原 calculate_rsi 的 pandas 实现"""
+    delta = pd.Series(prices).diff()
+    avg_gain = delta.clip(lower=0).rolling(window=periods).mean()
+    avg_loss = (-delta.clip(upper=0)).rolling(window=periods).mean()
+    return (100 - 100 / (1 + avg_gain / avg_loss)).to_numpy()
+
+
+def random_walk(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return 2000 * np.exp(np.cumsum(rng.normal(0, 0.01, rows)))
+
+
+PRICE_CASES = {
+    # 随机游走之后价格持平：持平窗口内涨跌幅均为0，RSI 为空值
+    'flat_after_walk': np.concatenate([random_walk(200), np.full(40, 1987.65)]),
+    # 单边上涨：跌幅为0，RSI 为100
+    'monotonic_up': np.concatenate([random_walk(100, seed=1), 2100 + np.arange(40) * 0.37]),
+    # 单边下跌：涨幅为0，RSI 为0
+    'monotonic_down': np.concatenate([random_walk(100, seed=2), 1900 - np.arange(40) * 0.41]),
+    'random_walk': random_walk(500, seed=3),
+}
+
+
+@pytest.mark.parametrize('name', PRICE_CASES)
+@pytest.mark.parametrize('periods', [7, 14, 21])
+def test_rsi_matches_pandas(name, periods):
+    prices = PRICE_CASES[name]
+    result = compute_indicators(prices, ma_windows=(), vol_window=None, rsi_period=periods)
+    np.testing.assert_allclose(result['RSI'], pandas_rsi(prices, periods),
+                               rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('name', PRICE_CASES)
+def test_rsi_grid_matches_pandas(name):
+    prices = PRICE_CASES[name]
+    periods = list(range(7, 22))
+    grid = indicator_grids(prices, [20], periods)['RSI']
+    for row, period in zip(grid, periods):
+        np.testing.assert_allclose(row, pandas_rsi(prices, period),
+                                   rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+def test_flat_window_rsi_is_nan():
+    prices = PRICE_CASES['flat_after_walk']
+    rsi = compute_indicators(prices, ma_windows=(), vol_window=None, rsi_period=14)['RSI']
+    assert np.isnan(rsi[-20:]).all()
+
+
+@pytest.mark.parametrize('name', PRICE_CASES)
+def test_streaming_rsi_matches_pandas(name):
+    prices = PRICE_CASES[name]
+    streaming = StreamingIndicators(ma_windows=(), rsi_period=14)
+    rsi = np.array([streaming.update(price)['RSI'] for price in prices])
+    np.testing.assert_allclose(rsi, pandas_rsi(prices, 14),
+                               rtol=1e-9, atol=1e-9, equal_nan=True)
@@ -0,0 +1,123 @@
+"""price_store.py 列式存储的测试"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import price_store  # noqa: E402
+from price_store import PRICE_COLUMNS, ColumnStore  # noqa: E402
+
+
+def price_frame(start, days, price):
+    """从 start 开始 days 天、价格为 price（标量或数组）的日线数据"""
+    dates = pd.date_range(start, periods=days, freq='D').strftime('%Y-%m-%d')
+    prices = np.broadcast_to(np.asarray(price, dtype=float), (days,))
+    frame = {'date': dates}
+    frame.update({col: prices for col in PRICE_COLUMNS})
+    return pd.DataFrame(frame)
+
+
+def test_version_changes_after_compact_and_reappend(tmp_path, monkeypatch):
+    monkeypatch.setattr(price_store, 'MAX_SEGMENTS', 32)
+    store = ColumnStore('gold_history', root=str(tmp_path))
+
+    # 33 次追加触发合并
+    for _ in range(33):
+        store.append(price_frame('2025-01-01', 365, 2000))
+    compacted = store.version()
+    assert len(store.manifest()['segments']) == 1
+
+    # 刷新末尾数据：同样的日期、修订后的价格，再次触发合并后总行数和最大日期不变
+    seen = {compacted}
+    for _ in range(32):
+        store.append(price_frame('2025-12-25', 7, 2500))
+        seen.add(store.version())
+    assert len(store.manifest()['segments']) == 1
+    assert len(seen) == 33  # 每次写入都得到新的版本
+    assert store.to_frame()['international_price_usd'].iloc[-1] == 2500
+
+
+def test_duplicate_dates_last_write_wins(tmp_path):
+    store = ColumnStore('gold_history', root=str(tmp_path))
+    store.append(price_frame('2025-01-01', 10, 2000))
+    store.append(price_frame('2025-01-06', 10, 2100))
+    store.append(price_frame('2025-01-08', 2, 2200))
+
+    df = store.to_frame()
+    assert list(df['date']) == list(pd.date_range('2025-01-01', periods=15).strftime('%Y-%m-%d'))
+    expected = [2000] * 5 + [2100] * 2 + [2200] * 2 + [2100] * 6
+    assert df['international_price_usd'].tolist() == expected
+
+
+def test_compact_keeps_latest_values(tmp_path):
+    store = ColumnStore('gold_history', root=str(tmp_path))
+    store.append(price_frame('2025-01-01', 10, np.arange(10) + 2000))
+    store.append(price_frame('2025-01-06', 10, np.arange(10) + 3000))
+    before = store.to_frame()
+    old_segments = [seg['name'] for seg in store.manifest()['segments']]
+
+    assert store.compact() == 15
+    segments = store.manifest()['segments']
+    assert len(segments) == 1
+    assert store.rows() == 15
+    pd.testing.assert_frame_equal(store.to_frame(), before)
+    for name in old_segments:
+        assert not os.path.exists(os.path.join(store.path, name))
+
+    # 区间读取：[start, end)
+    window = store.to_frame('2025-01-04', '2025-01-08')
+    assert list(window['date']) == ['2025-01-04', '2025-01-05', '2025-01-06', '2025-01-07']
+    assert window['international_price_usd'].tolist() == [2003, 2004, 3000, 3001]
+
+
+def test_manifest_reloads_writes_from_other_instances(tmp_path):
+    reader = ColumnStore('gold_history', root=str(tmp_path))
+    writer = ColumnStore('gold_history', root=str(tmp_path))
+    assert reader.rows() == 0
+
+    writer.append(price_frame('2025-01-01', 5, 2000))
+    assert reader.rows() == 5
+    writer.append(price_frame('2025-01-06', 5, 2100))
+    writer.compact()
+    assert reader.rows() == 10
+    assert reader.to_frame()['international_price_usd'].tolist() == [2000] * 5 + [2100] * 5
+
+
+def test_manifest_recovers_after_store_is_deleted(tmp_path):
+    store = ColumnStore('gold_history', root=str(tmp_path))
+    store.append(price_frame('2025-01-01', 5, 2000))
+    assert store.bounds() is not None
+
+    # 存储目录被删除后视为空存储，丢弃缓存的段，之后可以重新写入
+    for name in os.listdir(store.path):
+        path = os.path.join(store.path, name)
+        if os.path.isdir(path):
+            for file in os.listdir(path):
+                os.remove(os.path.join(path, file))
+            os.rmdir(path)
+        else:
+            os.remove(path)
+    os.rmdir(store.path)
+    assert store.rows() == 0
+    assert store.bounds() is None
+    assert store.to_frame().empty
+
+    store.append(price_frame('2025-02-01', 3, 2300))
+    assert store.to_frame()['international_price_usd'].tolist() == [2300] * 3
+
+
+def test_leftover_temporary_manifest_is_ignored(tmp_path):
+    store = ColumnStore('gold_history', root=str(tmp_path))
+    store.append(price_frame('2025-01-01', 5, 2000))
+
+    # 写清单时进程中断，留下写了一半的临时文件
+    with open(os.path.join(store.path, 'manifest.json.tmp'), 'w', encoding='utf-8') as f:
+        f.write('{"next_id": ')
+    reader = ColumnStore('gold_history', root=str(tmp_path))
+    assert reader.rows() == 5
+
+    store.append(price_frame('2025-01-06', 5, 2100))
+    assert reader.rows() == 10
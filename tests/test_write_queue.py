@@ -0,0 +1,145 @@
+"""database.WriteBehindQueue 的重试、坏数据隔离和写入回调测试"""
+import os
+import sqlite3
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """使用临时数据库，测试结束后恢复原连接池"""
+    monkeypatch.chdir(tmp_path)  # 导入 gold_analysis 时创建的文件都放在临时目录
+    old_pool = database._pool
+    database.configure_database(str(tmp_path / 'gold_prices.db'))
+    yield database
+    database._pool.close_all()
+    database._pool = old_pool
+
+
+@pytest.fixture
+def locked(db, monkeypatch):
+    """让接下来的 locked['left'] 次借出连接都报 "database is locked"，之后正常"""
+    state = {'left': 0, 'raised': 0}
+    real_connection = database.get_connection
+
+    @contextmanager
+    def connection():
+        if state['left'] > 0:
+            state['left'] -= 1
+            state['raised'] += 1
+            raise sqlite3.OperationalError('database is locked')
+        with real_connection() as conn:
+            yield conn
+
+    monkeypatch.setattr(database, 'get_connection', connection)
+    return state
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(**kwargs):
+        kwargs.setdefault('flush_interval', 0.01)
+        kwargs.setdefault('retry_delay', 0.001)
+        queue = database.WriteBehindQueue(**kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def quote_params(date, price):
+    return (database.date_to_day(date), date, price, price * 7.2, price * 7.4, 7.2, 1.03)
+
+
+def stored_prices():
+    with database._pool.connection() as conn:
+        return dict(conn.execute(
+            "SELECT date, international_price_usd FROM gold_prices ORDER BY day").fetchall())
+
+
+def test_locked_batch_is_retried_then_committed(locked, make_queue):
+    queue = make_queue(retries=4)
+    results = []
+    locked['left'] = 3
+
+    for day in range(1, 6):
+        assert queue.submit(database.UPSERT_GOLD_PRICE,
+                            quote_params(f'2025-01-0{day}', 2000 + day), results.append)
+    assert queue.flush(timeout=10)
+
+    assert locked['raised'] == 3
+    assert results == [True] * 5
+    assert stored_prices() == {f'2025-01-0{day}': 2000 + day for day in range(1, 6)}
+    stats = queue.stats()
+    assert stats['retries'] == 3
+    assert stats['written'] == 5
+    assert stats['failed'] == 0
+
+
+def test_bad_row_is_isolated(db, make_queue):
+    queue = make_queue()
+    results = []
+
+    queue.submit(database.UPSERT_GOLD_PRICE, quote_params('2025-01-01', 2001), results.append)
+    queue.submit(database.UPSERT_GOLD_PRICE, (1, 2), results.append)  # 参数个数错误
+    queue.submit(database.UPSERT_GOLD_PRICE, quote_params('2025-01-02', 2002), results.append)
+    assert queue.flush(timeout=10)
+
+    assert results == [True, False, True]
+    assert stored_prices() == {'2025-01-01': 2001, '2025-01-02': 2002}
+    stats = queue.stats()
+    assert stats['written'] == 2
+    assert stats['failed'] == 1
+
+
+def test_exhausted_retries_report_failure(locked, make_queue):
+    queue = make_queue(retries=2)
+    results = []
+    locked['left'] = 100
+
+    queue.submit(database.UPSERT_GOLD_PRICE, quote_params('2025-01-01', 2001), results.append)
+    assert queue.flush(timeout=10)
+
+    assert locked['raised'] == 3  # 首次写入 + 2 次重试
+    assert results == [False]
+    assert queue.stats()['failed'] == 1
+    locked['left'] = 0
+    assert stored_prices() == {}
+
+
+def test_failed_quote_is_not_marked_as_saved(locked, make_queue, monkeypatch):
+    import gold_analysis
+
+    queue = make_queue(retries=1)
+    monkeypatch.setattr(database, 'write_queue', queue)
+    monkeypatch.setattr(gold_analysis, '_last_saved_quote', {})
+    monkeypatch.setattr(gold_analysis, '_pending_quote', {})
+    record = dict(date='2025-01-01', international_price_usd=2001.0,
+                  international_price_cny=14407.2, china_price_cny=14839.4,
+                  usd_cny_rate=7.2, premium_rate=1.03)
+
+    # 写入最终失败：不记为已保存，下次页面运行重新提交
+    locked['left'] = 100
+    assert gold_analysis.save_quote_if_changed(**record)
+    assert queue.flush(timeout=10)
+    assert gold_analysis._last_saved_quote == {}
+    assert gold_analysis._pending_quote == {}
+
+    locked['left'] = 0
+    assert gold_analysis.save_quote_if_changed(**record)
+    assert queue.flush(timeout=10)
+    assert gold_analysis._last_saved_quote == record
+    assert stored_prices() == {'2025-01-01': 2001.0}
+
+    # 写入成功后相同行情不再提交
+    assert not gold_analysis.save_quote_if_changed(**record)